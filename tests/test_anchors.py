@@ -0,0 +1,73 @@
+# test_anchors.py - tests for the anchor scanner
+#
+# Copyright (C) 2026 agent
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# The files produced as output from the software do not automatically fall
+# under the copyright of the software, unless explicitly stated otherwise.
+
+"""Tests that check that the anchor scanner finds the same anchors
+regardless of how the content is split into parts."""
+
+import unittest
+
+from webcheck.parsers.html import anchors
+
+
+class _Link(object):
+    """Stand-in for the link that is scanned."""
+
+    encoding = None
+
+    def __init__(self):
+        self.anchors = []
+
+    def add_anchor(self, anchor):
+        self.anchors.append(anchor)
+
+
+# the document with anchors inside and outside of comments
+_document = (
+    '<html><body><!-- <a id="incomment"> --><p id="after">text</p>'
+    '<a\nname="split" href="x.html"><!-- ' + 'x' * (70 * 1024) +
+    ' <a name="longcomment"> --><div id=\'end\'></div></body></html>')
+
+
+class TestAnchors(unittest.TestCase):
+
+    def _scan(self, size):
+        """Feed the document in parts of the given size and return the
+        anchors that were found."""
+        link = _Link()
+        scanner = anchors.scanner(
+            link, ['incomment', 'after', 'split', 'longcomment', 'end'])
+        for i in range(0, len(_document), size):
+            scanner.feed(_document[i:i + size])
+        scanner.close()
+        return sorted(link.anchors)
+
+    def test_whole(self):
+        self.assertEqual(self._scan(len(_document)),
+                         ['after', 'end', 'split'])
+
+    def test_parts(self):
+        for size in (1, 2, 3, 7, 64, 4096):
+            self.assertEqual(self._scan(size), ['after', 'end', 'split'],
+                             'size %d' % size)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,295 @@
+# test_eventloop.py - tests for the event loop crawl engine
+#
+# Copyright (C) 2026 agent
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# The files produced as output from the software do not automatically fall
+# under the copyright of the software, unless explicitly stated otherwise.
+
+"""Tests that run the EventLoop against a local HTTP server and check that
+the crawl items are filled in the same way as with the ThreadPool."""
+
+import atexit
+import BaseHTTPServer
+import logging
+import shutil
+import socket
+import SocketServer
+import tempfile
+import threading
+import unittest
+
+from webcheck import crawler
+from webcheck.eventloop import EventLoop
+from webcheck.workers import ThreadPool
+
+
+# the page that is parsed
+_page = '''<html><head><title>Test page</title></head><body>
+<a id="top" href="other.html">other</a> <img src="image.png">
+</body></html>'''
+
+# the slow page is sent after two seconds or when the tests are done
+_slow_done = threading.Event()
+
+# the size of the large image that should not be downloaded
+_large_size = 32 * 1024 * 1024
+
+# set when the handler for the large image is done and whether the complete
+# image was sent
+_large_done = threading.Event()
+_large_sent = []
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Handler that serves the test pages."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, content_type, body, headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        if self.path in ('/image.png', '/large.png'):
+            # a server that does not support HEAD requests
+            self._send(405, 'text/plain', 'HEAD not allowed')
+        else:
+            self.do_GET()
+
+    def do_GET(self):
+        if self.path == '/page.html':
+            self._send(200, 'text/html', _page)
+        elif self.path == '/redirect.html':
+            self._send(302, 'text/html', 'moved',
+                       [('Location', '/page.html')])
+        elif self.path == '/chunked.html':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for i in range(0, len(_page), 20):
+                chunk = _page[i:i + 20]
+                self.wfile.write('%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.write('0\r\n\r\n')
+        elif self.path == '/image.png':
+            self._send(200, 'image/png', '\x89PNG\r\n\x1a\n' + 'x' * 100)
+        elif self.path == '/large.png':
+            try:
+                self._send(200, 'image/png', '\0' * _large_size)
+                _large_sent.append(True)
+            finally:
+                _large_done.set()
+        elif self.path == '/slow.html':
+            _slow_done.wait(2.0)
+            self._send(200, 'text/html', _page)
+        else:
+            self._send(404, 'text/html', 'not found')
+
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        BaseHTTPServer.HTTPServer.__init__(self, *args, **kwargs)
+        # the threads that handle requests (to wait for them at the end)
+        self.threads = []
+
+    def process_request(self, request, client_address):
+        thread = threading.Thread(target=self.process_request_thread,
+                                  args=(request, client_address))
+        thread.daemon = True
+        thread.start()
+        self.threads.append(thread)
+
+    def handle_error(self, request, client_address):
+        # the client may have closed the connection (e.g. after a timeout)
+        pass
+
+
+class _Query(list):
+    """Stand-in for the dynamic relationships of a link."""
+
+    def first(self):
+        return self[0] if self else None
+
+
+class _Link(object):
+    """Stand-in for a database link that the crawl items are made from."""
+
+    def __init__(self, url):
+        self.id = 1
+        self.url = url
+        self.is_internal = True
+        self.depth = 0
+        self.status = None
+        self.parents = _Query()
+        self.reqanchors = _Query()
+
+
+# the crawl item fields that should be the same for both engines
+_fields = ('status', 'mimetype', 'size', 'is_page', 'title', 'redirect',
+           'children', 'embedded', 'anchors', 'linkproblems',
+           'pageproblems', 'method', 'retry_after', 'connection_error')
+
+
+class TestEventLoop(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = _Server(('127.0.0.1', 0), _Handler)
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        cls.base = 'http://127.0.0.1:%d/' % cls.server.server_address[1]
+        # the cookie jar is saved to the output directory at exit
+        cls.output_dir = tempfile.mkdtemp()
+        atexit.register(shutil.rmtree, cls.output_dir, True)
+
+    @classmethod
+    def tearDownClass(cls):
+        _slow_done.set()
+        cls.server.shutdown()
+        cls.server.server_close()
+        for thread in cls.server.threads:
+            thread.join(5)
+
+    def _crawler(self):
+        """Return a new crawler (this also sets up the configuration)."""
+        return crawler.Crawler(dict(
+            base_urls=[self.base], output_dir=self.output_dir))
+
+    def _fetch(self, engine, path, timeout=None):
+        """Fetch the path (or URL) with the thread pool or event loop and
+        return the crawl item."""
+        c = self._crawler()
+        opener = crawler._setup_urllib2(c._connections, c._ftp_connections)
+        if engine == 'threads':
+            pool = ThreadPool(c._fetch_and_parse, 1)
+        else:
+            pool = EventLoop(c, opener, 1)
+        url = path if '://' in path else self.base + path
+        item = crawler.CrawlItem(_Link(url))
+        if timeout:
+            item.timeout = timeout
+        pool.submit(item)
+        results = []
+        while pool.pending:
+            results.extend(pool.get_results(10))
+        pool.close()
+        c._connections.close()
+        self.connections = (c._connections.opened, c._connections.reused)
+        self.assertEqual(results, [item])
+        return item
+
+    def _check(self, path, timeout=None):
+        """Check that both engines give the same result and return the
+        crawl item of the event loop."""
+        expected = self._fetch('threads', path, timeout)
+        item = self._fetch('eventloop', path, timeout)
+        for field in _fields:
+            self.assertEqual(
+                getattr(item, field), getattr(expected, field),
+                '%s: %r != %r' % (field, getattr(item, field),
+                                  getattr(expected, field)))
+        return item
+
+    def test_page(self):
+        item = self._check('page.html')
+        self.assertEqual(item.status, '200')
+        self.assertEqual(item.title, 'Test page')
+        self.assertEqual(item.children, [self.base + 'other.html'])
+        self.assertEqual(item.embedded, [self.base + 'image.png'])
+        self.assertEqual(item.anchors, ['top'])
+
+    def test_connections_counted(self):
+        self._fetch('eventloop', 'page.html')
+        self.assertEqual(self.connections, (1, 0))
+
+    def test_not_found(self):
+        item = self._check('missing.html')
+        self.assertEqual(item.status, '404')
+        self.assertEqual(len(item.linkproblems), 1)
+
+    def test_redirect(self):
+        item = self._check('redirect.html')
+        self.assertEqual(item.status, '302')
+        self.assertEqual(item.redirect, self.base + 'page.html')
+
+    def test_chunked(self):
+        item = self._check('chunked.html')
+        self.assertEqual(item.title, 'Test page')
+        self.assertEqual(item.anchors, ['top'])
+
+    def test_head_not_allowed(self):
+        item = self._check('image.png')
+        self.assertEqual(item.method, 'GET')
+        self.assertEqual(item.status, '200')
+        self.assertEqual(item.mimetype, 'image/png')
+
+    def test_head_not_allowed_large(self):
+        # the GET request after the refused HEAD should not download the
+        # whole image because the content is not needed
+        for engine in ('threads', 'eventloop'):
+            del _large_sent[:]
+            _large_done.clear()
+            item = self._fetch(engine, 'large.png')
+            self.assertEqual(item.status, '200')
+            self.assertEqual(item.size, _large_size)
+            self.assertTrue(_large_done.wait(10))
+            self.assertEqual(_large_sent, [], engine)
+
+    def test_timeout(self):
+        item = self._check('slow.html', timeout=0.5)
+        self.assertEqual(item.status, None)
+        self.assertEqual(len(item.linkproblems), 1)
+        self.assertEqual(item.retry_after, 0)
+        # the host responds so it should not be considered down
+        self.assertEqual(item.connection_error, None)
+
+    def test_refused(self):
+        # find a port that nothing listens on
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        item = self._check('http://127.0.0.1:%d/' % port)
+        self.assertEqual(item.status, None)
+        self.assertNotEqual(item.connection_error, None)
+
+    def test_unknown_host(self):
+        item = self._check('http://unknown.invalid/')
+        self.assertEqual(item.status, None)
+        self.assertEqual(len(item.linkproblems), 1)
+        self.assertNotEqual(item.connection_error, None)
+
+
+# ignore the messages that are logged while crawling
+logging.getLogger('webcheck').addHandler(logging.NullHandler())
+
+
+if __name__ == '__main__':
+    unittest.main()
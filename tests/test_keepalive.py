@@ -0,0 +1,136 @@
+# test_keepalive.py - tests for the keep-alive HTTP handlers
+#
+# Copyright (C) 2026 agent
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# The files produced as output from the software do not automatically fall
+# under the copyright of the software, unless explicitly stated otherwise.
+
+"""Tests that check when the keep-alive handlers send a request again on
+a new connection and how the connections are counted."""
+
+import BaseHTTPServer
+import httplib
+import socket
+import SocketServer
+import threading
+import unittest
+import urllib2
+
+from webcheck import keepalive
+
+
+# the paths of the requests that the server received
+_requests = []
+
+# set when the tests are done to stop waiting in the slow page
+_done = threading.Event()
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Handler that serves the test pages."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        _requests.append(self.path)
+        if self.path == '/slow.html':
+            _done.wait(2.0)
+        elif self.path == '/close.html':
+            # close the connection without sending a response
+            self.close_connection = 1
+            return
+        elif self.path == '/last.html':
+            # close the connection after the response without telling
+            self.close_connection = 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write('ok')
+
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # the client may have closed the connection (e.g. after a timeout)
+        pass
+
+
+class TestKeepAlive(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = _Server(('127.0.0.1', 0), _Handler)
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        cls.base = 'http://127.0.0.1:%d/' % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        _done.set()
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        del _requests[:]
+        self.pool = keepalive.ConnectionPool()
+        self.opener = urllib2.build_opener(
+            keepalive.HTTPHandler(self.pool))
+
+    def tearDown(self):
+        self.pool.close()
+
+    def _get(self, path, timeout=5):
+        response = self.opener.open(self.base + path, timeout=timeout)
+        try:
+            return response.read()
+        finally:
+            response.close()
+
+    def test_reuse(self):
+        self.assertEqual(self._get('page.html'), 'ok')
+        self.assertEqual(self._get('page.html'), 'ok')
+        self.assertEqual((self.pool.opened, self.pool.reused), (1, 1))
+
+    def test_closed_idle_connection(self):
+        self._get('last.html')
+        # the connection that was closed by the server should be replaced
+        self.assertEqual(self._get('page.html'), 'ok')
+        self.assertEqual(_requests, ['/last.html', '/page.html'])
+        self.assertEqual((self.pool.opened, self.pool.reused), (2, 0))
+
+    def test_timeout_not_retried(self):
+        self._get('page.html')
+        # the timeout on the reused connection should not be retried
+        self.assertRaises(socket.timeout, self._get, 'slow.html', 0.2)
+        self.assertEqual(_requests, ['/page.html', '/slow.html'])
+        self.assertEqual(self.pool.opened, 1)
+
+    def test_failed_request_counted(self):
+        # a new connection is counted even if the request fails
+        self.assertRaises(httplib.BadStatusLine, self._get, 'close.html')
+        self.assertEqual((self.pool.opened, self.pool.reused), (1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -31,6 +31,7 @@ import logging
 import webcheck
 import webcheck.monkeypatch
 from webcheck.crawler import Crawler, default_cfg
+from webcheck.db import STORAGE_PROFILES
 
 
 version_string = '''
@@ -96,6 +97,15 @@ parser.add_argument(
 parser.add_argument(
     '-c', '--continue', action='store_true',
     help='try to continue from a previous run')
+parser.add_argument(
+    '--incremental', action='store_true',
+    help='check the links of a previous run again, only fetching changed content')
+parser.add_argument(
+    '--compact-index', action='store_true',
+    help='keep only hashes of URLs in memory (for very large sites)')
+parser.add_argument(
+    '--storage', metavar='PROFILE', choices=sorted(STORAGE_PROFILES),
+    help='the SQLite settings to use: default, fast or bulk')
 parser.add_argument(
     '-f', '--force', action='store_true',
     help='overwrite files without asking')
@@ -107,7 +117,43 @@ parser.add_argument(
     help='maximum depth of links to follow from base urls')
 parser.add_argument(
     '-w', '--wait', metavar='SECONDS', type=float,
-    help='wait SECONDS between retrievals')
+    help='wait SECONDS between retrievals from the same host')
+parser.add_argument(
+    '--max-per-host', metavar='N', type=int,
+    help='do not have more than N requests to a single host in progress')
+parser.add_argument(
+    '--timeout', metavar='SECONDS', type=float,
+    help='wait at most SECONDS for data from a server')
+parser.add_argument(
+    '--connect-timeout', metavar='SECONDS', type=float,
+    help='wait at most SECONDS for a connection to a server')
+parser.add_argument(
+    '--dns-ttl', metavar='SECONDS', type=int,
+    help='remember the results of host name lookups for SECONDS (0 to disable)')
+parser.add_argument(
+    '--max-failures', metavar='N', type=int,
+    help='consider a host down after N connection failures in a row (0 to disable)')
+parser.add_argument(
+    '--probe-interval', metavar='SECONDS', type=float,
+    help='try a host that is down again after SECONDS')
+parser.add_argument(
+    '--retries', metavar='N', type=int,
+    help='retry links up to N times after a temporary error')
+parser.add_argument(
+    '--retry-delay', metavar='SECONDS', type=float,
+    help='wait SECONDS before the first retry, doubling it for every next retry')
+parser.add_argument(
+    '--max-size', metavar='KB', type=int,
+    help='do not download more than KB kilobytes of content of a page')
+parser.add_argument(
+    '-t', '--threads', metavar='N', type=int,
+    help='use N threads to fetch and parse links in parallel')
+parser.add_argument(
+    '--processes', metavar='N', type=int,
+    help='use N processes to fetch and parse links in parallel (useful for local files)')
+parser.add_argument(
+    '--event-loop', metavar='N', type=int,
+    help='use a single-threaded event loop with up to N requests in flight instead of threads')
 parser.add_argument(
     '--profile', action='store_true', help=argparse.SUPPRESS)
 parser.add_argument(
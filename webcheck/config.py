@@ -36,20 +36,94 @@ BASE_URLS_ONLY = False
 # line option.
 AVOID_EXTERNAL_LINKS = False
 
-# IO timeout as passed to socket.setdefaulttimeout()
-# value is a float in seconds None disables the timeout
+# The maximum time in seconds to wait for data from a server. A shorter
+# timeout is used for hosts that normally respond faster. None disables the
+# timeout. This is the state of the --timeout command line option.
 IOTIMEOUT = 10.0
 
+# The time in seconds to wait for a connection to a server to be set up.
+# None means that IOTIMEOUT is used. This is the state of the
+# --connect-timeout command line option.
+CONNECT_TIMEOUT = 3.0
+
+# The time in seconds that the results of host name lookups are kept (0
+# disables caching lookups). This is the state of the --dns-ttl command
+# line option.
+DNS_TTL = 300
+
 # Output directory. This is the state of the -o command line option.
 OUTPUT_DIR = '.'
 
 # Whether to try to read a state file to continue from.
 CONTINUE = False
 
-# This is the time in seconds to wait between requests. This is the state of
+# Whether to check all links of a previous run again, only fetching the
+# content that changed since then. This is the state of the --incremental
+# command line option and implies CONTINUE.
+INCREMENTAL = False
+
+# Whether to keep only hashes of URLs in the in-memory map of URLs to links
+# (uses less memory for very large sites). This is the state of the
+# --compact-index command line option.
+COMPACT_URL_INDEX = False
+
+# The settings that are used for the SQLite database: 'default' uses the
+# SQLite defaults, 'fast' uses a write-ahead log, memory-mapped I/O and less
+# syncing to disk and 'bulk' is the same as 'fast' but creates the indexes
+# on URLs and links between pages after the crawl. This is the state of the
+# --storage command line option.
+STORAGE_PROFILE = 'default'
+
+# This is the time in seconds to wait between requests to the same host. A
+# longer Crawl-delay from robots.txt is also honoured. This is the state of
 # the -w command line option.
 WAIT_BETWEEN_REQUESTS = 0
 
+# The maximum number of requests to a single host that may be in progress
+# at the same time (None means no limit). This is the state of the
+# --max-per-host command line option.
+MAX_PER_HOST = None
+
+# The number of connection failures in a row after which a host is
+# considered down and links to it are no longer fetched (0 disables this).
+# This is the state of the --max-failures command line option.
+MAX_HOST_FAILURES = 5
+
+# The time in seconds after which a host that is considered down is tried
+# again (None means never). This is the state of the --probe-interval
+# command line option.
+HOST_PROBE_INTERVAL = 300
+
+# The number of times a link is fetched again after a temporary error
+# (a timeout, reset connection, 429 or 5xx response). This is the state of
+# the --retries command line option.
+RETRIES = 2
+
+# The time in seconds to wait before the first retry of a link. The time is
+# doubled for every following retry (and a longer Retry-After sent by the
+# server is honoured). This is the state of the --retry-delay command line
+# option.
+RETRY_DELAY = 1.0
+
+# The number of threads that are used to fetch and parse links. This is the
+# state of the -t command line option.
+THREADS = 1
+
+# The number of processes that are used to fetch and parse links (None to
+# use threads or the event loop instead). This is the state of the
+# --processes command line option.
+PROCESSES = None
+
+# The number of HTTP requests that may be in flight at the same time when
+# using the single-threaded event loop instead of threads (None disables the
+# event loop). This is the state of the --event-loop command line option.
+EVENT_LOOP = None
+
+# The maximum size in kilobytes of content that is downloaded for parsing
+# (None means no limit). This is the state of the --max-size command line
+# option.
+MAX_TRANSFER_SIZE = None
+
 # Maximum number of links to follow from the specified base URLs.
 MAX_DEPTH = None
 
@@ -69,6 +143,7 @@ PLUGINS = ['webcheck.plugins.anchors',
            'webcheck.plugins.new',
            'webcheck.plugins.size',
            'webcheck.plugins.notitles',
+           'webcheck.plugins.duplicates',
            'webcheck.plugins.problems',
            'webcheck.plugins.about',
            'webcheck.plugins.csvfile']
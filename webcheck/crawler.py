@@ -28,27 +28,70 @@ manipulate the crawling of the website. This module also contains the Link
 class that holds all the link related properties."""
 
 import atexit
+import calendar
 import cookielib
 import datetime
-import httplib
+import email.utils
+import errno
+import hashlib
+import itertools
 import logging
+import mimetypes
+import mmap
 import os
+import random
 import re
-import robotparser
+import socket
 import time
 import urllib
 import urllib2
 import urlparse
+import zlib
 
-from webcheck import config
-from webcheck.db import Session, Link, setup_db, truncate_db
+from webcheck import config, ftp, keepalive
+from webcheck.db import Session, Link, children, embedded, setup_db, \
+    truncate_db, delete_links, drop_indexes, create_indexes, url_index
+from webcheck.dnscache import DNSCache
+from webcheck.eventloop import EventLoop
+from webcheck.frontier import Frontier
+from webcheck.parsecache import ParseCache
 from webcheck.output import install_file
+from webcheck.robots import RobotsCache
+from webcheck.scheduler import Scheduler
+from webcheck.workers import ThreadPool, ProcessPool
 import webcheck.parsers
+import webcheck.parsers.html
+import webcheck.parsers.html.anchors
 
 
 logger = logging.getLogger(__name__)
 
 
+# the longest Retry-After time in seconds that is waited for before
+# retrying a link (if the server wants a longer wait the error is kept)
+MAX_RETRY_AFTER = 300
+
+# the number of crawl results that are stored before all objects are
+# removed from the database session (this keeps the memory use bounded)
+SESSION_BATCH_SIZE = 1000
+
+# the maximum number of crawl results that are stored in the database
+# with a single commit and the maximum time in seconds that results are
+# kept before they are committed
+COMMIT_BATCH_SIZE = 100
+COMMIT_INTERVAL = 5
+
+# the time in seconds between progress messages
+PROGRESS_INTERVAL = 30
+
+# the counters that are updated while fetching links (and are collected
+# from worker processes) as (crawler attribute, counter) tuples
+_FETCH_COUNTERS = (
+    ('_connections', 'opened'), ('_connections', 'reused'),
+    ('_ftp_connections', 'opened'), ('_ftp_connections', 'reused'),
+    ('_dnscache', 'hits'), ('_dnscache', 'misses'))
+
+
 class RedirectError(urllib2.HTTPError):
 
     def __init__(self, url, code, msg, hdrs, fp, newurl):
@@ -56,15 +99,27 @@ class RedirectError(urllib2.HTTPError):
         urllib2.HTTPError.__init__(self, url, code, msg, hdrs, fp)
 
 
+class _Request(urllib2.Request):
+    """Request that uses the specified HTTP method."""
+
+    def __init__(self, url, method='GET'):
+        urllib2.Request.__init__(self, url)
+        self.method = method
+
+    def get_method(self):
+        return self.method
+
+
 class NoRedirectHandler(urllib2.HTTPRedirectHandler):
 
     def redirect_request(self, req, fp, code, msg, headers, newurl):
         raise RedirectError(req.get_full_url(), code, msg, headers, fp, newurl)
 
 
-def _setup_urllib2():
+def _setup_urllib2(pool, ftp_pool):
     """Configure the urllib2 module to store cookies in the output
-    directory."""
+    directory and to reuse HTTP and FTP connections from the pools. The
+    installed opener is returned."""
     import webcheck  # local import to avoid import loop
     filename = os.path.join(config.OUTPUT_DIR, 'cookies.txt')
     # set up our cookie jar
@@ -75,16 +130,77 @@ def _setup_urllib2():
         pass
     atexit.register(cookiejar.save, ignore_discard=False, ignore_expires=False)
     # set up our custom opener that sets a meaningful user agent
+    handlers = [keepalive.HTTPHandler(pool), ftp.FTPHandler(ftp_pool)]
+    if hasattr(keepalive, 'HTTPSHandler'):
+        handlers.append(keepalive.HTTPSHandler(pool))
     opener = urllib2.build_opener(urllib2.HTTPCookieProcessor(cookiejar),
-                                  NoRedirectHandler())
+                                  NoRedirectHandler(), *handlers)
     opener.addheaders = [
       ('User-agent', 'webcheck %s' % webcheck.__version__),
+      ('Accept-encoding', 'gzip, deflate'),
       ]
     if config.BYPASSHTTPCACHE:
         opener.addheaders.append(('Cache-control', 'no-cache'))
         opener.addheaders.append(('Pragma', 'no-cache'))
     urllib2.install_opener(opener)
+    return opener
+
+
+class _ContentDecoder(object):
+    """Streaming decoder for content that was transferred with the gzip or
+    deflate content encoding. Other content is passed unchanged."""
 
+    def __init__(self, encoding):
+        self.encoding = (encoding or '').strip().lower()
+        if self.encoding in ('gzip', 'x-gzip'):
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == 'deflate':
+            self._decompressor = zlib.decompressobj()
+        else:
+            self._decompressor = None
+        self._started = False
+
+    def decompress(self, data, max_length=0):
+        """Return the decoded data for the next part of the content. If
+        max_length is not 0 no more than max_length bytes of compressed
+        content are returned (the data that was not decoded is kept in
+        unconsumed_tail)."""
+        if self._decompressor is None:
+            return data
+        try:
+            data = self._decompressor.decompress(data, max_length)
+        except zlib.error:
+            # some servers send deflate data without the zlib header
+            if self.encoding != 'deflate' or self._started:
+                raise
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            data = self._decompressor.decompress(data, max_length)
+        self._started = True
+        return data
+
+    @property
+    def unconsumed_tail(self):
+        """The data that was not decoded because of max_length."""
+        if self._decompressor is None:
+            return ''
+        return self._decompressor.unconsumed_tail
+
+    def flush(self):
+        """Return any remaining decoded data."""
+        if self._decompressor is None:
+            return ''
+        return self._decompressor.flush()
+
+
+# the number of bytes that are read from a response at a time
+_CHUNK_SIZE = 64 * 1024
+
+# local files of at least this size are memory mapped instead of read
+_MMAP_SIZE = 1024 * 1024
+
+# the errors of socket operations that mean no connection could be made
+_connect_errors = (errno.ECONNREFUSED, errno.EHOSTUNREACH, errno.ENETUNREACH,
+                   errno.EHOSTDOWN, errno.ENETDOWN, errno.ETIMEDOUT)
 
 # pattern for matching spaces
 _spacepattern = re.compile(' ')
@@ -93,13 +209,85 @@ _spacepattern = re.compile(' ')
 _anchorpattern = re.compile('#([^#]+)$')
 
 
+def _wants_content(link):
+    """Return whether the content of the link is needed. If it is not,
+    checking the headers of the link is enough."""
+    # see if the content type can be guessed from the URL
+    mimetype = mimetypes.guess_type(link.url)[0]
+    # the content of external links is only needed to look for anchors
+    if not link.is_internal:
+        if link.reqanchors.first() is None:
+            return False
+        return mimetype is None or mimetype in webcheck.parsers.html.mimetypes
+    return mimetype is None or \
+        webcheck.parsers.get_parsermodule(mimetype) is not None
+
+
+def _update_wants_content(link):
+    """Update whether the content of the link is needed now that the
+    mimetype is known."""
+    if link.is_internal:
+        # internal content that can be parsed is always needed
+        if webcheck.parsers.get_parsermodule(link.mimetype) is not None:
+            link.wants_content = True
+    elif link.mimetype not in webcheck.parsers.html.mimetypes:
+        # anchors are only looked for in external HTML pages
+        link.wants_content = False
+
+
+def _get_memory_usage():
+    """Return the resident set size of the process in bytes (None if it
+    cannot be determined)."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * mmap.PAGESIZE
+    except (IOError, OSError, IndexError, ValueError):
+        return None
+
+
+def _is_connect_error(e):
+    """Check whether the socket error means that no connection could be made
+    to the host (as opposed to a problem with an established connection).
+    Timeouts are only reported this way while connecting."""
+    return isinstance(e, (socket.gaierror, socket.herror, socket.timeout)) \
+        or (bool(e.args) and e.args[0] in _connect_errors)
+
+
+def _is_temporary(e):
+    """Check whether the socket error is a timeout or reset connection that
+    may go away when trying again."""
+    return isinstance(e, socket.timeout) or \
+        e.args[:1] == (errno.ECONNRESET, )
+
+
+def _get_retry_after(info):
+    """Return the number of seconds to wait according to the Retry-After
+    header of the response (0 if there is no such header)."""
+    value = info.getheader('Retry-After', '').strip()
+    if value.isdigit():
+        return int(value)
+    retry_after = email.utils.parsedate_tz(value)
+    if retry_after:
+        return max(0, email.utils.mktime_tz(retry_after) - time.time())
+    return 0
+
+
 # get default configuration
 default_cfg = dict(
     internal=[], external=[], yank=[], base_only=config.BASE_URLS_ONLY,
     avoid_external=config.AVOID_EXTERNAL_LINKS, ignore_robots=not(config.USE_ROBOTS),
     output=config.OUTPUT_DIR, force=config.OVERWRITE_FILES,
     redirects=config.REDIRECT_DEPTH, max_depth=config.MAX_DEPTH,
-    wait=config.WAIT_BETWEEN_REQUESTS)
+    wait=config.WAIT_BETWEEN_REQUESTS, max_per_host=config.MAX_PER_HOST,
+    timeout=config.IOTIMEOUT, connect_timeout=config.CONNECT_TIMEOUT,
+    dns_ttl=config.DNS_TTL,
+    max_failures=config.MAX_HOST_FAILURES, retries=config.RETRIES,
+    retry_delay=config.RETRY_DELAY,
+    probe_interval=config.HOST_PROBE_INTERVAL,
+    threads=config.THREADS, processes=config.PROCESSES,
+    event_loop=config.EVENT_LOOP, max_size=config.MAX_TRANSFER_SIZE,
+    incremental=config.INCREMENTAL, compact_index=config.COMPACT_URL_INDEX,
+    storage=config.STORAGE_PROFILE)
 default_cfg.update({'continue': config.CONTINUE})
 
 
@@ -114,6 +302,110 @@ class Config(object):
         vars(self).update(kwargs)
 
 
+class CrawlItem(object):
+    """Detached copy of a link that is passed to the fetching and parsing
+    code. This object provides the part of the Link interface that is used
+    by the parsers but does not access the database so it can be filled in
+    from any thread. The gathered information is later stored in the
+    database by Crawler._store_item()."""
+
+    def __init__(self, link):
+        self.link_id = link.id
+        self.url = link.url
+        self.is_internal = link.is_internal
+        self.depth = link.depth
+        # the encoding is determined again from the response
+        self.encoding = None
+        # find a page that links to this one
+        parent = link.parents.first()
+        self.referer = parent.url if parent else None
+        # external pages are only scanned for the requested anchors
+        self.reqanchors = set()
+        if not link.is_internal:
+            self.reqanchors = set(x.anchor for x in link.reqanchors)
+        # use a HEAD request if the content is not needed
+        self.wants_content = _wants_content(link)
+        # validators of the content that was fetched in a previous run
+        self.stored_etag = self.stored_mtime = None
+        if config.INCREMENTAL and link.status == '200':
+            self.stored_etag = link.etag
+            self.stored_mtime = link.mtime
+        # the read timeout (the connect timeout is always the same)
+        self.timeout = config.IOTIMEOUT
+        self.method = 'GET'
+        if not self.wants_content and \
+           urlparse.urlsplit(self.url)[0] in ('http', 'https', 'ftp'):
+            self.method = 'HEAD'
+        # information that is gathered about the link
+        self.fetched = None
+        self.status = None
+        self.mimetype = None
+        self.size = None
+        self.transfer_size = None
+        self.mtime = None
+        self.etag = None
+        self.not_modified = False
+        self.connection_error = None
+        # the time it took before the response started to come in
+        self.latency = None
+        # the minimum time to wait before retrying after a temporary error
+        self.retry_after = None
+        self.is_page = None
+        self.title = None
+        self.author = None
+        # the SHA-1 digest of the content and whether it was parsed before
+        self.digest = None
+        self.parsed_before = False
+        self.redirect = None
+        self.children = []
+        self.embedded = []
+        self.anchors = []
+        self.linkproblems = []
+        self.pageproblems = []
+
+    def set_encoding(self, encoding):
+        """Set the encoding of the link doing some basic checks to see if
+        the encoding is supported."""
+        if not self.encoding and encoding:
+            try:
+                logger.debug('crawler.CrawlItem.set_encoding(%r)', encoding)
+                unicode('just some random text', encoding, 'replace')
+                self.encoding = encoding
+            except Exception, e:
+                logger.exception('unknown encoding: %s', encoding)
+                self.add_pageproblem('unknown encoding: %s' % encoding)
+
+    def add_redirect(self, url):
+        """Indicate that this link redirects to the specified url."""
+        self.redirect = url
+
+    def add_linkproblem(self, message):
+        """Indicate that something went wrong while retrieving this link."""
+        self.linkproblems.append(message)
+
+    def add_pageproblem(self, message):
+        """Indicate that something went wrong with parsing the document."""
+        # only think about problems on internal pages
+        if self.is_internal:
+            self.pageproblems.append(message)
+
+    def add_child(self, url):
+        """Add the specified URL as a child of this link."""
+        # ignore children for external links
+        if self.is_internal:
+            self.children.append(url)
+
+    def add_embed(self, url):
+        """Mark the given URL as used as an image on this page."""
+        # ignore embeds for external links
+        if self.is_internal:
+            self.embedded.append(url)
+
+    def add_anchor(self, anchor):
+        """Indicate that this page contains the specified anchor."""
+        self.anchors.append(anchor)
+
+
 class Crawler(object):
     """Class to represent gathered data of a site.
 
@@ -147,13 +439,61 @@ class Crawler(object):
         config.AVOID_EXTERNAL_LINKS = self.cfg.avoid_external
         config.USE_ROBOTS = not(self.cfg.ignore_robots)
         config.OUTPUT_DIR = self.cfg.output_dir
-        config.CONTINUE = getattr(self.cfg, 'continue')
+        config.INCREMENTAL = self.cfg.incremental
+        config.CONTINUE = getattr(self.cfg, 'continue') or config.INCREMENTAL
+        config.COMPACT_URL_INDEX = self.cfg.compact_index
+        config.STORAGE_PROFILE = self.cfg.storage
         config.OVERWRITE_FILES = self.cfg.force
         config.REDIRECT_DEPTH = self.cfg.redirects
         config.MAX_DEPTH = self.cfg.max_depth
         config.WAIT_BETWEEN_REQUESTS = self.cfg.wait
-        # map of scheme+netloc to robot parsers
-        self._robotparsers = {}
+        config.MAX_PER_HOST = self.cfg.max_per_host
+        config.IOTIMEOUT = self.cfg.timeout
+        config.CONNECT_TIMEOUT = self.cfg.connect_timeout
+        config.DNS_TTL = self.cfg.dns_ttl
+        config.MAX_HOST_FAILURES = self.cfg.max_failures
+        config.HOST_PROBE_INTERVAL = self.cfg.probe_interval
+        config.RETRIES = self.cfg.retries
+        config.RETRY_DELAY = self.cfg.retry_delay
+        config.THREADS = self.cfg.threads
+        config.PROCESSES = self.cfg.processes
+        config.EVENT_LOOP = self.cfg.event_loop
+        config.MAX_TRANSFER_SIZE = self.cfg.max_size
+        # the robots.txt files of the sites (set up when crawling)
+        self._robots = None
+        # the results of host name lookups
+        self._dnscache = DNSCache(config.DNS_TTL)
+        # idle HTTP connections that can be reused
+        self._connections = keepalive.ConnectionPool()
+        self._ftp_connections = keepalive.ConnectionPool()
+        # the limits on requests per host
+        self._scheduler = Scheduler(config.WAIT_BETWEEN_REQUESTS,
+                                    config.MAX_PER_HOST,
+                                    config.MAX_HOST_FAILURES,
+                                    config.HOST_PROBE_INTERVAL,
+                                    config.IOTIMEOUT)
+        # the links that still need to be crawled
+        self._frontier = Frontier()
+        # depth -> number of internal links that are being fetched
+        self._fetching = {}
+        # ids of the links that are being fetched (links are only marked
+        # as fetched in the database when the result is stored)
+        self._checking = set()
+        # link id -> anchors that the external page was scanned for
+        self._scanned = {}
+        # the results of parsing recently seen content
+        self._parsecache = ParseCache()
+        # statistics about the crawl as a list of (description, value)
+        self.statistics = []
+        # the time the crawl was started and the number of unchanged links
+        self._started = None
+        self._not_modified = 0
+        # the number of links that were not fetched because the host is down
+        self._short_circuited = 0
+        # the number of times a link was fetched again after an error
+        self._retried = 0
+        # the number of pages with content that was parsed before
+        self._parsed_before = 0
         # set up empty site name
         self.site_name = None
         # load the plugins
@@ -203,30 +543,18 @@ class Crawler(object):
                 return False
         return True
 
-    def _get_robotparser(self, scheme, netloc):
-        """Return the proper robots parser for the given url or None if one
-        cannot be constructed. Robot parsers are cached per scheme and
-        netloc."""
+    def _get_robots(self, scheme, netloc):
+        """Return the robots.txt rules for the given site or None if the
+        scheme does not support robots.txt files."""
         # only some schemes have a meaningful robots.txt file
         if scheme != 'http' and scheme != 'https':
             logger.debug('called with unsupported scheme (%s)', scheme)
             return None
-        # split out the key part of the url
         location = urlparse.urlunsplit((scheme, netloc, '', '', ''))
-        # try to create a new robotparser if we don't already have one
-        if location not in self._robotparsers:
-            logger.info('getting robots.txt for %s', location)
-            self._robotparsers[location] = None
-            try:
-                rp = robotparser.RobotFileParser()
-                rp.set_url(urlparse.urlunsplit(
-                  (scheme, netloc, '/robots.txt', '', '')))
-                rp.read()
-                self._robotparsers[location] = rp
-            except (TypeError, IOError, httplib.HTTPException):
-                # ignore any problems setting up robot parser
-                pass
-        return self._robotparsers[location]
+        robots = self._robots.get(location)
+        if robots.crawl_delay:
+            self._scheduler.set_crawl_delay(location, robots.crawl_delay)
+        return robots
 
     def _is_yanked(self, url):
         """Check whether the specified url should not be checked at all.
@@ -253,8 +581,8 @@ class Crawler(object):
         if not is_internal:
             return None
         # check robots for remaining links
-        rp = self._get_robotparser(scheme, netloc)
-        if rp and not rp.can_fetch('webcheck', url):
+        robots = self._get_robots(scheme, netloc)
+        if robots and not robots.can_fetch(url):
             return 'robot restriced'
         # fall back to allowing the url
         return None
@@ -268,124 +596,559 @@ class Crawler(object):
             links = links.filter(Link.depth <= config.MAX_DEPTH)
         return links.filter(Link.yanked == None)
 
+    def _get_max_fetch_depth(self):
+        """Return the maximum depth of links that may be fetched now. A link
+        is only fetched when all internal pages that are at least two levels
+        less deep have been handled. At that point no shorter path to the
+        link can be found any more so the depth of the link is final."""
+        depths = self._fetching.keys()
+        # internal links are queued with priority 0
+        queued = self._frontier.min_depth(0)
+        if queued is not None:
+            depths.append(queued)
+        if depths:
+            return min(depths) + 1
+
+    def _queue(self, link, delay=None):
+        """Add the link to the frontier if it still needs to be crawled. The
+        delay can be used to not crawl the link in the next few seconds."""
+        if link is None or link.fetched or link.yanked or \
+           link.id in self._checking:
+            return
+        if config.MAX_DEPTH != None and link.depth > config.MAX_DEPTH:
+            return
+        # crawl internal links first because they may lead to more links
+        is_internal = self._is_internal(link.url)
+        priority = 0 if is_internal else 1
+        # start getting robots.txt for new internal sites
+        if is_internal and config.USE_ROBOTS:
+            scheme, netloc = urlparse.urlsplit(link.url)[0:2]
+            if scheme in ('http', 'https'):
+                self._robots.prefetch(
+                    urlparse.urlunsplit((scheme, netloc, '', '', '')))
+        self._frontier.push(link.id, link.url, link.depth, priority, delay)
+
     def crawl(self):
         """Crawl the website based on the urls specified with add_base().
         If the serialization file pointer is specified the crawler writes
         out updated links to the file while crawling the site."""
         # connect to the database
         self.setup_database()
+        if config.DNS_TTL:
+            self._dnscache.install()
         # configure urllib2 to store cookies in the output directory
-        _setup_urllib2()
+        opener = _setup_urllib2(self._connections, self._ftp_connections)
+        self._robots = RobotsCache(
+            os.path.join(config.OUTPUT_DIR, 'robots'), opener)
+        # set up the processes, threads or event loop that do the fetching
+        # and parsing (processes are started before any other threads)
+        if config.PROCESSES:
+            pool = ProcessPool(self._fetch_and_parse, config.PROCESSES,
+                               self._get_counters)
+        elif config.EVENT_LOOP:
+            pool = EventLoop(self, opener, config.EVENT_LOOP)
+        else:
+            pool = ThreadPool(self._fetch_and_parse, config.THREADS)
         # get a database session
         session = Session()
         # remove all links
         if not config.CONTINUE:
             truncate_db()
+            # create some indexes only after the crawl for bulk loading
+            if config.STORAGE_PROFILE == 'bulk':
+                drop_indexes()
+        self._started = datetime.datetime.now()
+        if config.INCREMENTAL:
+            # the depth of links is determined again
+            session.query(Link).update(dict(depth=None),
+                                       synchronize_session=False)
+        elif config.CONTINUE:
+            # queue the links that were not yet crawled in a previous run
+            links = self._get_links_to_crawl(session)
+            for link in links.yield_per(SESSION_BATCH_SIZE):
+                self._queue(link)
+            session.expunge_all()
         # add all internal urls to the database
         for url in self.base_urls:
-            self._get_link(session, url)
-        # add some URLs from the database that haven't been fetched
-        tocheck = self._get_links_to_crawl(session)
-        remaining = tocheck.count()
-        tocheck = tocheck[:100]
-        remaining -= len(tocheck)
+            link = self._get_link(session, url)
+            link.depth = 0
+            if config.INCREMENTAL:
+                self._recheck(link)
+            self._queue(link)
+        session.commit()
+        # the number of links handled (in total, since the session was last
+        # cleared and since the last commit) and when the next commit and
+        # progress report should be done
+        checked = stored = uncommitted = 0
+        next_commit = time.time() + COMMIT_INTERVAL
+        next_progress = time.time() + PROGRESS_INTERVAL
         # repeat until we have nothing more to check
-        while tocheck:
-            # choose a link from the tocheck list
-            link = tocheck.pop()
-            link.is_internal = self._is_internal(link.url)
-            link.yanked = self._is_yanked(str(link.url))
-            # see if there are any more links to check
-            if not tocheck:
-                tocheck = self._get_links_to_crawl(session)
-                remaining = tocheck.count()
-                tocheck = tocheck[:100]
-                remaining -= len(tocheck)
-            # skip link it there is nothing to check
-            if link.yanked or link.fetched:
+        while True:
+            # store the results in the database in groups (a commit waits
+            # for the data to be written to disk)
+            if uncommitted >= COMMIT_BATCH_SIZE or \
+               stored >= SESSION_BATCH_SIZE or \
+               (uncommitted and time.time() >= next_commit):
+                session.commit()
+                uncommitted = 0
+                next_commit = time.time() + COMMIT_INTERVAL
+            # remove objects that are no longer needed from the session
+            if stored >= SESSION_BATCH_SIZE:
+                session.expunge_all()
+                stored = 0
+            if time.time() >= next_progress:
+                self._log_progress(checked, pool)
+                next_progress = time.time() + PROGRESS_INTERVAL
+            # hand out links to the pool until it is full
+            delay = None
+            while pool.pending < pool.capacity:
+                # get the next link whose host can be sent a request now
+                link_id, delay = self._frontier.pop(
+                    self._scheduler, self._get_max_fetch_depth())
+                if link_id is None:
+                    break
+                link = session.query(Link).get(link_id)
+                link.is_internal = self._is_internal(link.url)
+                link.yanked = self._is_yanked(str(link.url))
+                # skip link it there is nothing to check
+                if link.yanked or link.fetched or link.id in self._checking:
+                    continue
+                item = CrawlItem(link)
+                # use a timeout based on the host's response times and do
+                # not try to connect to hosts that are down but give links
+                # that are retried the maximum time and another chance
+                error = None
+                if not link.retries:
+                    item.timeout = self._scheduler.get_timeout(item.url)
+                    error = self._scheduler.get_error(item.url)
+                if error is not None:
+                    logger.info('%s: %s', item.url, error)
+                    item.fetched = datetime.datetime.now()
+                    item.add_linkproblem(error)
+                    self._short_circuited += 1
+                    self._store_item(session, item)
+                    checked += 1
+                    stored += 1
+                    uncommitted += 1
+                    continue
+                # remember the link to avoid loops
+                self._checking.add(item.link_id)
+                self._scheduler.start(item.url)
+                if item.is_internal:
+                    self._fetching[item.depth] = \
+                        self._fetching.get(item.depth, 0) + 1
+                pool.submit(item)
+            # we are done if nothing is being fetched
+            if not pool.pending:
+                session.commit()
+                uncommitted = 0
+                if delay is None:
+                    if self._rescan_anchors(session):
+                        continue
+                    break
+                # wait until a host can be sent a request again
+                logger.debug('sleeping %s seconds', delay)
+                time.sleep(delay)
                 continue
-            # fetch the link's contents
-            response = self._fetch_link(link)
-            if response:
-                self._parse_response(link, response)
-            # flush database changes
-            session.commit()
-            # sleep between requests if configured
-            if config.WAIT_BETWEEN_REQUESTS > 0:
-                logger.debug('sleeping %s seconds',
-                             config.WAIT_BETWEEN_REQUESTS)
-                time.sleep(config.WAIT_BETWEEN_REQUESTS)
-            logger.debug('items left to check: %d' %
-                          (remaining + len(tocheck)))
+            # do not wait for results longer than stored results may be
+            # kept without committing them
+            if uncommitted:
+                wait = max(0, next_commit - time.time())
+                delay = wait if delay is None else min(delay, wait)
+            # store the fetched information in the database
+            for item in pool.get_results(delay):
+                self._checking.discard(item.link_id)
+                self._scheduler.done(
+                    item.url, item.connection_error, item.latency)
+                if item.is_internal:
+                    self._fetching[item.depth] -= 1
+                    if not self._fetching[item.depth]:
+                        del self._fetching[item.depth]
+                if not self._retry(session, item):
+                    self._store_item(session, item)
+                    checked += 1
+                stored += 1
+                uncommitted += 1
+            logger.debug('items being checked: %d, links queued: %d',
+                         pool.pending, len(self._frontier))
+        pool.close()
+        self._add_counters(getattr(pool, 'counters', {}))
+        self._connections.close()
+        self._ftp_connections.close()
+        self._dnscache.uninstall()
         session.commit()
         session.close()
+        create_indexes()
+        # log some statistics about the crawl
+        self.statistics = [
+            ('HTTP connections opened', self._connections.opened),
+            ('HTTP connections reused', self._connections.reused),
+            ]
+        if self._ftp_connections.opened:
+            self.statistics.append(
+                ('FTP connections opened', self._ftp_connections.opened))
+            self.statistics.append(
+                ('FTP connections reused', self._ftp_connections.reused))
+        if config.DNS_TTL:
+            self.statistics.append(
+                ('DNS lookups', self._dnscache.misses))
+            self.statistics.append(
+                ('DNS cache hit rate', '%.1f%%' % self._dnscache.hit_rate()))
+        if config.USE_ROBOTS:
+            self.statistics.append(
+                ('robots.txt files downloaded', self._robots.fetched))
+            self.statistics.append(
+                ('robots.txt files from cache', self._robots.cached))
+        self.statistics.append(('URL index entries', len(url_index)))
+        self.statistics.append(
+            ('URL index memory', '%d kB' % (url_index.memory() / 1024)))
+        self.statistics.append(
+            ('URL index hit rate', '%.1f%%' % url_index.hit_rate()))
+        if config.INCREMENTAL:
+            self.statistics.append(('links not modified', self._not_modified))
+        if self._retried:
+            self.statistics.append(('links retried', self._retried))
+        if self._parsed_before:
+            self.statistics.append(
+                ('pages with content that was parsed before',
+                 self._parsed_before))
+        if self._short_circuited:
+            self.statistics.append(
+                ('links not checked because the host was down',
+                 self._short_circuited))
+        for description, value in self.statistics:
+            logger.info('%s: %s', description, value)
+
+    def _get_counters(self):
+        """Return the values of the counters that are updated while
+        fetching links."""
+        return dict(((name, counter), getattr(getattr(self, name), counter))
+                    for name, counter in _FETCH_COUNTERS)
+
+    def _add_counters(self, counters):
+        """Add the counter values (e.g. from worker processes) to the
+        counters of the crawler."""
+        for (name, counter), value in counters.items():
+            obj = getattr(self, name)
+            setattr(obj, counter, getattr(obj, counter) + value)
+
+    def _log_progress(self, checked, pool):
+        """Log how far the crawl has come and the memory use."""
+        memory = _get_memory_usage()
+        logger.info(
+            'links checked: %d, being checked: %d, queued: %d, memory: %s',
+            checked, pool.pending, len(self._frontier),
+            '%.1f MB' % (memory / 1048576.0) if memory else 'unknown')
+
+    def _fetch_and_parse(self, item):
+        """Fetch and parse the contents of the crawl item. This function is
+        called from the worker threads and should not access the database."""
+        if urlparse.urlsplit(item.url)[0] == 'file':
+            self._fetch_and_parse_file(item)
+            return
+        response = self._fetch_link(item)
+        if response:
+            if item.wants_content:
+                self._parse_response(item, response)
+            # release the connection (this aborts any unread content)
+            response.close()
+
+    def _fetch_and_parse_file(self, link):
+        """Check and parse a local file directly, without going through
+        urllib2."""
+        logger.info(link.url)
+        link.fetched = datetime.datetime.now()
+        # like urllib2, the query is considered part of the file name
+        path, query = urlparse.urlsplit(str(link.url))[2:4]
+        if query:
+            path += '?' + query
+        path = urllib.url2pathname(path)
+        # use the index file of directories
+        if os.path.isdir(path) and \
+           os.path.isfile(os.path.join(path, 'index.html')):
+            link.add_redirect(link.url.rstrip('/') + '/index.html')
+            return
+        try:
+            with open(path, 'rb') as f:
+                stats = os.fstat(f.fileno())
+                link.mimetype = mimetypes.guess_type(path)[0]
+                link.size = link.transfer_size = stats.st_size
+                link.mtime = datetime.datetime.utcfromtimestamp(
+                    int(stats.st_mtime))
+                _update_wants_content(link)
+                if link.wants_content:
+                    self._parse_content(link, self._read_file(link, f))
+        except (IOError, OSError), e:
+            # report the problem in the same way as urllib2 does
+            self._handle_error(link, urllib2.URLError(e))
+
+    def _recheck(self, link):
+        """Ensure that a link that was checked in a previous run is checked
+        again."""
+        if link.fetched and link.fetched < self._started:
+            link.fetched = None
+            link.yanked = None
+            link.retries = 0
+
+    def _retry(self, session, item):
+        """Queue the link again if the crawl item got a temporary error
+        and the link has not been retried too often. Returns True if the
+        link will be retried."""
+        if item.retry_after is None or item.retry_after > MAX_RETRY_AFTER:
+            return False
+        link = session.query(Link).get(item.link_id)
+        retries = link.retries or 0
+        if retries >= config.RETRIES:
+            return False
+        link.retries = retries + 1
+        # exponential backoff with jitter to not retry all at the same time
+        delay = config.RETRY_DELAY * 2 ** retries
+        delay = max(item.retry_after, random.uniform(delay / 2.0, delay))
+        logger.info('retrying %s in %.1f seconds', link.url, delay)
+        link.fetched = None
+        self._queue(link, delay)
+        self._retried += 1
+        return True
+
+    def _store_item(self, session, item):
+        """Store the information gathered in the crawl item in the
+        database."""
+        link = session.query(Link).get(item.link_id)
+        link.fetched = item.fetched
+        if item.reqanchors:
+            self._scanned[item.link_id] = item.reqanchors
+        if item.parsed_before:
+            self._parsed_before += 1
+        if item.not_modified:
+            # keep the information from the previous run
+            self._not_modified += 1
+        else:
+            self._update_link(link, item)
+        # check the links on the page again
+        if config.INCREMENTAL:
+            for child in itertools.chain(link.children, link.embedded):
+                child.update_depth(link.depth + 1)
+                self._recheck(child)
+                self._queue(child)
+
+    def _rescan_anchors(self, session):
+        """Queue external pages again if anchors on them were requested
+        after they were scanned. Returns whether any link was queued."""
+        links = session.query(Link).filter(Link.is_internal == False)
+        links = links.filter(Link.fetched != None).filter(Link.status == '200')
+        links = links.filter(Link.mimetype.in_(webcheck.parsers.html.mimetypes))
+        links = links.filter(Link.reqanchors.any())
+        queued = False
+        for link in links:
+            scanned = self._scanned.get(link.id, set())
+            if any(x.anchor not in scanned for x in link.reqanchors):
+                logger.debug('scanning %s again for anchors', link.url)
+                link.fetched = None
+                self._queue(link)
+                queued = True
+        return queued
+
+    def _update_link(self, link, item):
+        """Replace the information in the link with that of the crawl
+        item."""
+        if config.INCREMENTAL:
+            link.clear()
+        link.status = item.status
+        link.mimetype = item.mimetype
+        link.encoding = item.encoding
+        link.size = item.size
+        link.transfer_size = item.transfer_size
+        link.mtime = item.mtime
+        link.etag = item.etag
+        link.is_page = item.is_page
+        link.title = item.title
+        link.author = item.author
+        link.digest = item.digest
+        for message in item.linkproblems:
+            link.add_linkproblem(message)
+        if item.redirect:
+            target = link.add_redirect(item.redirect)
+            # the target of a redirecting base link is also a base link
+            if target is not None and link.depth == 0:
+                target.update_depth(0)
+            self._queue(target)
+        for child in link.add_embeds(item.embedded):
+            self._queue(child)
+        for child in link.add_children(item.children):
+            self._queue(child)
+        for anchor in item.anchors:
+            link.add_anchor(anchor)
+        for message in item.pageproblems:
+            link.add_pageproblem(message)
+
+    def _get_request(self, link):
+        """Return a urllib2 request object for fetching the link."""
+        # FIXME: if an URI has a username:passwd add the uri, username and password to the HTTPPasswordMgr
+        request = _Request(link.url, link.method)
+        # the timeout of the request may be shortened for fast hosts so
+        # use the maximum for connecting if no connect timeout is set
+        request.connect_timeout = config.CONNECT_TIMEOUT or config.IOTIMEOUT
+        if link.referer:
+            request.add_header('Referer', link.referer)
+        # only get the content if it changed since the previous run
+        if link.stored_etag:
+            request.add_header('If-None-Match', link.stored_etag)
+        if link.stored_mtime:
+            request.add_header('If-Modified-Since', email.utils.formatdate(
+                calendar.timegm(link.stored_mtime.timetuple()), usegmt=True))
+        return request
 
     def _fetch_link(self, link):
         """Attempt to fetch the url and return content. This updates the
         link with information retrieved."""
         logger.info(link.url)
-        # mark the link as fetched to avoid loops
         link.fetched = datetime.datetime.now()
         # see if we can import the proper module for this scheme
         try:
-            # FIXME: if an URI has a username:passwd add the uri, username and password to the HTTPPasswordMgr
-            request = urllib2.Request(link.url)
-            parent = link.parents.first()
-            if parent:
-                request.add_header('Referer', parent.url)
-            response = urllib2.urlopen(request, timeout=config.IOTIMEOUT)
-            info = response.info()
-            link.mimetype = info.gettype()
-            link.set_encoding(response.headers.getparam('charset'))
-            # get result code and other stuff
-            link.status = str(response.code)
-            try:
-                link.size = int(info.getheader('Content-length'))
-            except (TypeError, ValueError):
-                pass
-            mtime = info.getdate('Last-Modified')
-            if mtime:
-                link.mtime = datetime.datetime(*mtime[:7])
-            # if response.status == 301: link.add_linkproblem(str(response.status)+': '+response.reason)
-            # elif response.status != 200: link.add_linkproblem(str(response.status)+': '+response.reason)
-            # TODO: add checking for size
-            return response
-        except RedirectError, e:
-            link.status = str(e.code)
-            logger.info(str(e))
-            if e.code == 301:
-                link.add_linkproblem(str(e))
-            link.add_redirect(e.newurl)
-        except urllib2.HTTPError, e:
-            link.status = str(e.code)
-            logger.info(str(e))
-            link.add_linkproblem(str(e))
+            while True:
+                try:
+                    started = time.time()
+                    response = urllib2.urlopen(self._get_request(link),
+                                               timeout=link.timeout)
+                    link.latency = time.time() - started
+                except urllib2.HTTPError, e:
+                    if self._head_failed(link, e):
+                        continue
+                    raise
+                self._handle_response(link, response)
+                if link.method == 'HEAD' and link.wants_content:
+                    # the content turned out to be needed after all
+                    link.method = 'GET'
+                    continue
+                return response
         except urllib2.URLError, e:
-            logger.info(str(e))
-            link.add_linkproblem(str(e))
+            self._handle_error(link, e)
         except KeyboardInterrupt:
             # handle this in a higher-level exception handler
             raise
         except Exception, e:
             # handle all other exceptions
             logger.exception('unknown exception caught: ' + str(e))
-            link.add_linkproblem('error reading HTTP response: %s' % str(e))
+            self._handle_failure(link, e)
+
+    def _head_failed(self, link, e):
+        """Check whether the HTTP error was caused by the server not
+        supporting HEAD requests. If so, the link is switched to use a GET
+        request and True is returned."""
+        if link.method == 'HEAD' and e.code in (405, 501):
+            logger.debug('HEAD request refused, retrying with GET')
+            e.close()
+            link.method = 'GET'
+            return True
+        return False
+
+    def _handle_response(self, link, response):
+        """Update the link with the information from the response
+        headers."""
+        info = response.info()
+        link.mimetype = info.gettype()
+        _update_wants_content(link)
+        link.set_encoding(response.headers.getparam('charset'))
+        # get result code and other stuff
+        link.status = str(response.code)
+        try:
+            link.transfer_size = int(info.getheader('Content-length'))
+        except (TypeError, ValueError):
+            pass
+        # with a content encoding the content length is the compressed size
+        encoding = info.getheader('Content-encoding', '').strip().lower()
+        if encoding in ('', 'identity'):
+            link.size = link.transfer_size
+        mtime = info.getdate('Last-Modified')
+        if mtime:
+            link.mtime = datetime.datetime(*mtime[:7])
+        link.etag = info.getheader('ETag')
+        # if response.status == 301: link.add_linkproblem(str(response.status)+': '+response.reason)
+        # elif response.status != 200: link.add_linkproblem(str(response.status)+': '+response.reason)
+        # TODO: add checking for size
+
+    def _handle_error(self, link, e):
+        """Update the link with the information from the urllib2 exception
+        that was raised while fetching it."""
+        if isinstance(e, urllib2.HTTPError) and e.code == 304:
+            logger.debug('not modified')
+            link.not_modified = True
+            e.close()
+            return
+        logger.info(str(e))
+        if isinstance(e, RedirectError):
+            link.status = str(e.code)
+            if e.code == 301:
+                link.add_linkproblem(str(e))
+            link.add_redirect(e.newurl)
+        elif isinstance(e, urllib2.HTTPError):
+            link.status = str(e.code)
+            link.add_linkproblem(str(e))
+            # the server may be temporarily overloaded
+            if e.code == 429 or e.code >= 500:
+                link.retry_after = _get_retry_after(e.info())
+        else:
+            link.add_linkproblem(str(e))
+            if isinstance(e.reason, socket.error):
+                # remember problems connecting to the host
+                if _is_connect_error(e.reason):
+                    link.connection_error = str(e)
+                if _is_temporary(e.reason):
+                    link.retry_after = 0
+        # release the connection of the error response
+        if isinstance(e, urllib2.HTTPError):
+            e.close()
+
+    def _handle_failure(self, link, e):
+        """Update the link with the information from an unexpected
+        exception that was raised while fetching it."""
+        message = 'error reading HTTP response: %s' % str(e)
+        link.add_linkproblem(message)
+        # the connection was made so the host is not considered down but a
+        # timeout or a reset connection may go away when trying again
+        if isinstance(e, socket.error) and _is_temporary(e):
+            link.retry_after = 0
 
     def _parse_response(self, link, response):
         """Parse the fetched response content."""
+        self._parse_content(link, self._read_content(link, response))
+
+    def _parse_content(self, link, chunks):
+        """Parse the content that is returned by the chunks iterator."""
+        if not link.is_internal:
+            self._scan_anchors(link, chunks)
+            return
         # find a parser for the content-type
         parsermodule = webcheck.parsers.get_parsermodule(link.mimetype)
         if parsermodule is None:
             logger.debug('unsupported content-type: %s', link.mimetype)
             return
+        digest = hashlib.sha1()
         try:
-            # skip parsing of content if we were returned nothing
-            content = response.read()
-            if content is None:
+            feeder = None
+            if hasattr(parsermodule, 'feeder'):
+                feeder = parsermodule.feeder(link)
+            if feeder is not None:
+                # parse the content while it is being read
+                logger.debug('parsing using %s', parsermodule.__name__)
+                for data in chunks:
+                    digest.update(data)
+                    feeder.feed(data)
+                feeder.close()
+                link.digest = digest.hexdigest()
                 return
-            # parse the content
+            content = ''.join(chunks)
+            digest.update(content)
+            link.digest = digest.hexdigest()
+            # content that was seen before does not need to be parsed again
+            if self._parsecache.get(link.digest, link):
+                logger.debug('content was parsed before')
+                link.parsed_before = True
+                return
+            pageproblems = len(link.pageproblems)
             logger.debug('parsing using %s', parsermodule.__name__)
             parsermodule.parse(content, link)
+            self._parsecache.put(link.digest, link, pageproblems)
         except KeyboardInterrupt:
             # handle this in a higher-level exception handler
             raise
@@ -393,13 +1156,116 @@ class Crawler(object):
             logger.exception('problem parsing page: %s', str(e))
             link.add_pageproblem('problem parsing page: %s' % str(e))
 
+    def _scan_anchors(self, link, chunks):
+        """Look for the requested anchors in the content of an external
+        page. Reading stops as soon as all anchors have been found."""
+        scanner = webcheck.parsers.html.anchors.scanner(link, link.reqanchors)
+        try:
+            for data in chunks:
+                scanner.feed(data)
+                if not scanner.missing:
+                    break
+        except KeyboardInterrupt:
+            # handle this in a higher-level exception handler
+            raise
+        except Exception, e:
+            logger.exception('problem scanning page: %s', str(e))
+        scanner.close()
+
+    def _read_content(self, link, response):
+        """Read the response body in chunks, decoding any gzip or deflate
+        content encoding, and return the parts as they become available.
+        Reading stops at the maximum transfer size. This also records the
+        transferred and decoded sizes."""
+        decoder = _ContentDecoder(response.info().getheader('Content-encoding'))
+        maxsize = None
+        if config.MAX_TRANSFER_SIZE:
+            maxsize = config.MAX_TRANSFER_SIZE * 1024
+        transfer_size = size = 0
+        while True:
+            data = response.read(_CHUNK_SIZE)
+            if data:
+                transfer_size += len(data)
+                # do not decode more than the maximum size so compressed
+                # content cannot take more memory than that
+                if maxsize is None:
+                    content = decoder.decompress(data)
+                else:
+                    content = decoder.decompress(
+                        data, max(maxsize - size, 1))
+            else:
+                content = decoder.flush()
+            # there is more content if not all data could be decoded
+            if maxsize is not None and (
+                    size + len(content) > maxsize or decoder.unconsumed_tail):
+                yield content[:maxsize - size]
+                link.add_pageproblem(
+                  'content truncated at %d bytes' % maxsize)
+                # keep any sizes that were found in the headers
+                link.transfer_size = link.transfer_size or transfer_size
+                link.size = link.size or maxsize
+                return
+            size += len(content)
+            if content:
+                yield content
+            if not data:
+                break
+        link.transfer_size = transfer_size
+        link.size = size
+
+    def _read_file(self, link, f):
+        """Return the contents of the local file in chunks. Large files are
+        memory mapped and reading stops at the maximum transfer size."""
+        size = link.size
+        if config.MAX_TRANSFER_SIZE and \
+           size > config.MAX_TRANSFER_SIZE * 1024:
+            size = config.MAX_TRANSFER_SIZE * 1024
+            link.add_pageproblem('content truncated at %d bytes' % size)
+        if size < _MMAP_SIZE:
+            yield f.read(size)
+            return
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for offset in range(0, size, _CHUNK_SIZE):
+                yield data[offset:min(offset + _CHUNK_SIZE, size)]
+        finally:
+            data.close()
+
+    def _remove_stale_links(self, session):
+        """Remove all links that can no longer be reached from the base
+        URLs (e.g. links that were only found on pages that changed since the
+        previous run)."""
+        # build a map of links to the links they refer to
+        refs = {}
+        for table in (children, embedded):
+            for parent_id, child_id in session.query(table.c.parent_id,
+                                                     table.c.child_id):
+                refs.setdefault(parent_id, []).append(child_id)
+        # find all links that can be reached from the base URLs
+        reachable = set()
+        todo = [self._get_link(session, url).id for url in self.base_urls]
+        while todo:
+            link_id = todo.pop()
+            if link_id not in reachable:
+                reachable.add(link_id)
+                todo.extend(refs.get(link_id, ()))
+        stale = [x for x, in session.query(Link.id) if x not in reachable]
+        if stale:
+            logger.info('removing %d links that are no longer used',
+                        len(stale))
+            session.commit()
+            delete_links(stale)
+
     def postprocess(self):
-        """Do some basic post processing of the collected data, including
-        depth calculation of every link."""
+        """Do some basic post processing of the collected data and call the
+        postprocess() function of the plugins."""
         # ensure we have a connection to the database
         self.setup_database()
         # get a database session
         session = Session()
+        # remove links from a previous run that are no longer used
+        if config.INCREMENTAL:
+            self._remove_stale_links(session)
         # build the list of urls that were set up with add_base() that
         # do not have a parent (they form the base for the site)
         bases = []
@@ -418,25 +1284,6 @@ class Crawler(object):
             bases.append(link)
         # set the site name
         self.site_name = bases[0].title or bases[0].url
-        # do a breadth first traversal of the website to determine depth
-        session.query(Link).update(dict(depth=None), synchronize_session=False)
-        session.commit()
-        depth = 0
-        count = len(bases)
-        for link in bases:
-            link.depth = 0
-        session.commit()
-        while count > 0:
-            logger.debug('%d links at depth %d%s', count, depth,
-                         ' (max)' if depth == config.MAX_DEPTH else '')
-            # update the depth of all links without a depth that have a
-            # parent with the previous depth
-            qry = session.query(Link).filter(Link.depth == None)
-            qry = qry.filter(Link.linked_from.any(Link.depth == depth))
-            count = qry.update(dict(depth=depth + 1), synchronize_session=False)
-            session.commit()
-            depth += 1
-            # TODO: also handle embeds
         session.commit()
         session.close()
         # see if any of the plugins want to do postprocessing
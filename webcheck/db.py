@@ -24,8 +24,7 @@ import logging
 import urlparse
 
 from sqlalchemy import Table, Column, Integer, Boolean, String, DateTime, ForeignKey
-from sqlalchemy import create_engine
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import create_engine, event, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, backref, sessionmaker
 from sqlalchemy.orm.session import object_session
@@ -33,6 +32,7 @@ from sqlalchemy.sql.expression import union
 
 from webcheck import config
 from webcheck.myurllib import normalizeurl
+from webcheck.urlindex import URLIndex
 
 
 logger = logging.getLogger(__name__)
@@ -42,6 +42,35 @@ logger = logging.getLogger(__name__)
 Session = sessionmaker()
 Base = declarative_base()
 
+# the maximum number of values in a single IN clause (SQLite limits the
+# number of parameters in a statement)
+_IN_CHUNK_SIZE = 500
+
+# map of the URLs of all links to their ids (filled by setup_db())
+url_index = URLIndex()
+
+# the SQLite settings (PRAGMA statements) that are used for every database
+# connection with each of the storage profiles
+STORAGE_PROFILES = {
+    # the SQLite defaults: the safest but slowest settings
+    'default': [
+        ('journal_mode', 'DELETE'),
+        ('synchronous', 'FULL'),
+        ],
+    # use a write-ahead log (which also allows reading the database while
+    # the crawl writes to it), only sync to disk at checkpoints and use
+    # memory-mapped I/O and a bigger page cache
+    'fast': [
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('mmap_size', 256 * 1024 * 1024),
+        ('cache_size', -64 * 1024),  # negative values are in kilobytes
+        ],
+    }
+
+# the bulk profile also creates some indexes only after the crawl
+STORAGE_PROFILES['bulk'] = STORAGE_PROFILES['fast']
+
 
 children = Table(
     'children', Base.metadata,
@@ -72,10 +101,13 @@ class Link(Base):
     mimetype = Column(String)
     encoding = Column(String)
     size = Column(Integer)
+    transfer_size = Column(Integer)
     mtime = Column(DateTime, index=True)
+    etag = Column(String)
     is_page = Column(Boolean, index=True)
     title = Column(String, index=True)
     author = Column(String)
+    digest = Column(String, index=True)
 
     # relationships between links
     children = relationship('Link', secondary=children,
@@ -91,7 +123,8 @@ class Link(Base):
 
     # crawling information
     redirectdepth = Column(Integer, default=0)
-    depth = Column(Integer, default=0)
+    depth = Column(Integer)
+    retries = Column(Integer, default=0)
 
     @staticmethod
     def clean_url(url):
@@ -100,35 +133,91 @@ class Link(Base):
 
     @staticmethod
     def get_or_create(session, url):
-        """This expects a clean url."""
-        session.commit()
-        while True:
-            instance = session.query(Link).filter_by(url=url).first()
-            if instance:
-                return instance
-            try:
-                instance = Link(url=url)
-                session.add(instance)
-                session.commit()
-                return instance
-            except IntegrityError:
-                pass  # will try again
-
-    def _get_child(self, url):
-        """Get a link object for the specified URL."""
-        # get the session
+        """This expects a clean url. The link is created in the session but
+        the session is not committed."""
+        link_id = url_index.get(url)
+        if link_id is not None:
+            return session.query(Link).get(link_id)
+        instance = session.query(Link).filter_by(url=url).first()
+        if not instance:
+            instance = Link(url=url)
+            session.add(instance)
+            # get the id of the new link
+            session.flush()
+        url_index.add(url, instance.id)
+        return instance
+
+    @staticmethod
+    def get_or_create_ids(session, urls, depth=None):
+        """Return a dictionary of the link ids for the (clean) URLs and the
+        list of links that were created. Links that do not exist yet are
+        created (with the specified depth) in a single statement. This does
+        not commit the session."""
+        ids = {}
+        missing = []
+        for url in set(urls):
+            link_id = url_index.get(url)
+            if link_id is None:
+                missing.append(url)
+            else:
+                ids[url] = link_id
+        created = []
+        if missing:
+            # new links get higher ids than all existing links so they can
+            # be found without using the index on URLs (the crawler is the
+            # only one writing to the database)
+            last_id = session.query(func.max(Link.id)).scalar() or 0
+            session.execute(Link.__table__.insert(),
+                            [dict(url=url, depth=depth) for url in missing])
+            created = session.query(Link).filter(Link.id > last_id).all()
+            for link in created:
+                ids[link.url] = link.id
+                url_index.add(link.url, link.id)
+        return ids, created
+
+    def _add_children(self, table, urls):
+        """Add the URLs to the children or embedded table in bulk, together
+        with the requested anchors. The ids of the URLs and the list of
+        links that are new or were found through a shorter path (and may
+        need to be crawled) are returned."""
+        # ignore children for external links
+        if not self.is_internal or not urls:
+            return [], []
         session = object_session(self)
-        # normalise the URL, removing the fragment from the URL
-        url, fragment = urlparse.urldefrag(normalizeurl(url))
-        # try to find the link
-        instance = self.get_or_create(session, url)
-        # we may have discovered a shorter path
-        instance.depth = min(instance.depth, self.depth + 1) or self.depth + 1
+        depth = self.depth + 1
+        # normalise the URLs, removing the fragment from the URL
+        urls = [urlparse.urldefrag(normalizeurl(url)) for url in urls]
+        ids, links = self.get_or_create_ids(
+            session, [url for url, fragment in urls], depth)
+        # we may have discovered a shorter path to existing links
+        created = set(link.id for link in links)
+        known = [x for x in set(ids.itervalues()) if x not in created]
+        for i in range(0, len(known), _IN_CHUNK_SIZE):
+            for link in session.query(Link).filter(
+                    Link.id.in_(known[i:i + _IN_CHUNK_SIZE])).filter(
+                    (Link.depth == None) | (Link.depth > depth)):
+                link.update_depth(depth)
+                links.append(link)
+        session.execute(table.insert(), [
+            dict(parent_id=self.id, child_id=ids[url]) for url, fragment in urls])
         # mark that we were looking for an anchor/fragment
-        if fragment:
-            instance.add_reqanchor(self, fragment)
-        # return the link
-        return instance
+        anchors = set((ids[url], self._mk_unicode(fragment).lower())
+                      for url, fragment in urls if fragment)
+        if anchors:
+            anchors.difference_update(session.query(
+                RequestedAnchor.link_id, RequestedAnchor.anchor).filter(
+                RequestedAnchor.parent_id == self.id))
+        if anchors:
+            session.execute(RequestedAnchor.__table__.insert(), [
+                dict(link_id=link_id, parent_id=self.id, anchor=anchor)
+                for link_id, anchor in anchors])
+        return [ids[url] for url, fragment in urls], links
+
+    def update_depth(self, depth):
+        """Set the depth of the link if it is lower than the current
+        depth."""
+        if self.depth is None or depth < self.depth:
+            self.depth = depth
 
     def _mk_unicode(self, message):
         """Turn the message into a unicode object."""
@@ -149,11 +238,15 @@ class Link(Base):
                 self.add_pageproblem('unknown encoding: %s' % encoding)
 
     def add_redirect(self, url):
-        """Indicate that this link redirects to the specified url."""
+        """Indicate that this link redirects to the specified url. The
+        link of the redirect target is returned (None if there is a
+        problem with the redirect)."""
         session = object_session(self)
         url = self.clean_url(url)
         # check for (possibly indirect) redirects to self
-        for link in session.query(Link).filter_by(url=url):
+        link_id = url_index.get(url)
+        if link_id is not None:
+            link = session.query(Link).get(link_id)
             if link.follow_link() == self:
                 link.add_linkproblem('redirects back to source: %s' % self.url)
                 self.add_linkproblem('redirects back to source: %s' % link.url)
@@ -166,7 +259,25 @@ class Link(Base):
             self.add_linkproblem('too many redirects (%d)' % self.redirectdepth)
             return
         # add child
-        self.add_child(url)
+        return self.add_child(url)
+
+    def clear(self):
+        """Remove the information that was found when the link was fetched
+        before. This keeps the anchors that are requested by other links."""
+        session = object_session(self)
+        self.encoding = None
+        self.redirectdepth = 0
+        self.linkproblems = []
+        self.pageproblems = []
+        session.query(Anchor).filter(Anchor.link_id == self.id).delete(
+            synchronize_session=False)
+        session.query(RequestedAnchor).filter(
+            RequestedAnchor.parent_id == self.id).delete(
+            synchronize_session=False)
+        session.execute(children.delete().where(
+            children.c.parent_id == self.id))
+        session.execute(embedded.delete().where(
+            embedded.c.parent_id == self.id))
 
     def add_linkproblem(self, message):
         """Indicate that something went wrong while retrieving this link."""
@@ -181,20 +292,27 @@ class Link(Base):
         self.pageproblems.append(PageProblem(message=self._mk_unicode(message)))
 
     def add_child(self, url):
-        """Add the specified URL as a child of this link."""
-        # ignore children for external links
-        if not self.is_internal:
-            return
-        # add to children
-        self.children.append(self._get_child(url))
+        """Add the specified URL as a child of this link. The link of the
+        child is returned."""
+        for link_id in self._add_children(children, [url])[0]:
+            return object_session(self).query(Link).get(link_id)
+
+    def add_children(self, urls):
+        """Add the specified URLs as children of this link. The links that
+        are new or that were found through a shorter path are returned."""
+        return self._add_children(children, urls)[1]
 
     def add_embed(self, url):
-        """Mark the given URL as used as an image on this page."""
-        # ignore embeds for external links
-        if not self.is_internal:
-            return
-        # add to embedded
-        self.embedded.append(self._get_child(url))
+        """Mark the given URL as used as an image on this page. The link of
+        the embedded URL is returned."""
+        for link_id in self._add_children(embedded, [url])[0]:
+            return object_session(self).query(Link).get(link_id)
+
+    def add_embeds(self, urls):
+        """Mark the given URLs as used as images on this page. The links
+        that are new or that were found through a shorter path are
+        returned."""
+        return self._add_children(embedded, urls)[1]
 
     def add_anchor(self, anchor):
         """Indicate that this page contains the specified anchor."""
@@ -318,12 +436,61 @@ class RequestedAnchor(Base):
         return self.anchor
 
 
+# the indexes that are only created after the crawl with the bulk storage
+# profile (the indexes on child_id are needed to find the parents of links
+# while crawling)
+_deferred_indexes = [
+    index for table in (Link.__table__, children, embedded)
+    for index in table.indexes
+    if index.name in ('ix_links_url', 'ix_children_parent_id',
+                      'ix_embedded_parent_id')]
+
+
+def _configure_connection(dbapi_connection, connection_record):
+    """Apply the settings of the storage profile to the new connection."""
+    cursor = dbapi_connection.cursor()
+    for name, value in STORAGE_PROFILES[config.STORAGE_PROFILE]:
+        cursor.execute('PRAGMA %s = %s' % (name, value))
+    cursor.close()
+
+
+def _load_url_index():
+    """Fill the URL index with all links in the database."""
+    session = Session()
+    url_index.clear()
+    for link_id, url in session.query(Link.id, Link.url):
+        url_index.add(url, link_id)
+    session.close()
+
+
+def _add_missing_columns(engine):
+    """Add the columns that are missing from the tables of a database that
+    was created by an older version (create_all() only creates tables that
+    do not exist yet)."""
+    for table in Base.metadata.sorted_tables:
+        existing = set(row[1] for row in engine.execute(
+            'PRAGMA table_info(%s)' % table.name))
+        for column in table.columns:
+            if column.name not in existing:
+                logger.debug('adding column %s.%s', table.name, column.name)
+                engine.execute('ALTER TABLE %s ADD COLUMN %s %s' % (
+                    table.name, column.name,
+                    column.type.compile(engine.dialect)))
+
+
 def setup_db(filename):
     # open the sqlite file
     engine = create_engine('sqlite:///' + filename)
+    event.listen(engine, 'connect', _configure_connection)
     Session.configure(bind=engine)
-    # ensure that all tables are created
+    # ensure that all tables and columns are created
     Base.metadata.create_all(engine)
+    _add_missing_columns(engine)
+    # add indexes that are missing after an interrupted bulk load or for
+    # columns that were added
+    create_indexes()
+    url_index.clear(config.COMPACT_URL_INDEX)
+    _load_url_index()
 
 
 def truncate_db():
@@ -343,3 +510,61 @@ def truncate_db():
     session.commit()
     session.query(Link).delete()
     session.commit()
+    url_index.clear()
+
+
+def drop_indexes():
+    """Remove the indexes that are not needed while crawling so adding
+    links in bulk is faster. The indexes are added again with
+    create_indexes()."""
+    session = Session()
+    for index in _deferred_indexes:
+        session.execute('DROP INDEX IF EXISTS %s' % index.name)
+    session.commit()
+    session.close()
+
+
+def create_indexes():
+    """Create the indexes that are missing from the database, e.g. those
+    that were removed by drop_indexes() or those of columns that were
+    added by _add_missing_columns() (this does nothing if all indexes
+    exist)."""
+    session = Session()
+    connection = session.connection()
+    existing = set(name for name, in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index'"))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name not in existing:
+                logger.debug('creating index %s', index.name)
+                index.create(connection)
+    session.commit()
+    session.close()
+
+
+def delete_links(ids):
+    """Remove the links with the specified ids from the database together
+    with all information that refers to them."""
+    session = Session()
+    ids = list(ids)
+    for i in range(0, len(ids), _IN_CHUNK_SIZE):
+        chunk = ids[i:i + _IN_CHUNK_SIZE]
+        session.query(LinkProblem).filter(
+            LinkProblem.link_id.in_(chunk)).delete(synchronize_session=False)
+        session.query(PageProblem).filter(
+            PageProblem.link_id.in_(chunk)).delete(synchronize_session=False)
+        session.query(Anchor).filter(
+            Anchor.link_id.in_(chunk)).delete(synchronize_session=False)
+        session.query(RequestedAnchor).filter(
+            RequestedAnchor.link_id.in_(chunk) |
+            RequestedAnchor.parent_id.in_(chunk)).delete(
+            synchronize_session=False)
+        session.execute(children.delete().where(
+            children.c.parent_id.in_(chunk) | children.c.child_id.in_(chunk)))
+        session.execute(embedded.delete().where(
+            embedded.c.parent_id.in_(chunk) | embedded.c.child_id.in_(chunk)))
+        session.query(Link).filter(Link.id.in_(chunk)).delete(
+            synchronize_session=False)
+        session.commit()
+    session.close()
+    _load_url_index()
@@ -0,0 +1,105 @@
+# dnscache.py - process-local cache of host name lookups
+#
+# Copyright (C) 2026 agent
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# The files produced as output from the software do not automatically fall
+# under the copyright of the software, unless explicitly stated otherwise.
+
+"""Cache of the results of socket.getaddrinfo() that is shared by all
+threads. While installed, all host name lookups (by urllib2, httplib and
+the event loop) go through the cache.
+
+The system resolver does not provide the TTL of the records so results
+are kept for a fixed time. Host names that do not exist are also cached
+(for a shorter time) so links to such hosts fail right away."""
+
+import logging
+import socket
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+# the time in seconds that non-existing host names are remembered
+NEGATIVE_TTL = 60
+
+# lookup errors that mean that the host name does not exist
+_negative_errors = set(getattr(socket, name) for name in
+                       ('EAI_NONAME', 'EAI_NODATA') if hasattr(socket, name))
+
+
+class DNSCache(object):
+    """Cache of host name lookups.
+
+    The available properties of this class are:
+
+      ttl     - the time in seconds that lookup results are kept
+      hits    - the number of lookups that were answered from the cache
+      misses  - the number of lookups that were passed to the resolver
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key -> (expiry time, result or exception)
+        self._cache = {}
+        # the function that does the actual lookups
+        self._getaddrinfo = socket.getaddrinfo
+
+    def getaddrinfo(self, *args, **kwargs):
+        """Replacement for socket.getaddrinfo() that uses the cache."""
+        key = (args, tuple(sorted(kwargs.items())))
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+            else:
+                entry = None
+                self.misses += 1
+        if entry is None:
+            try:
+                entry = (now + self.ttl, self._getaddrinfo(*args, **kwargs))
+            except socket.gaierror, e:
+                if e.args[0] not in _negative_errors:
+                    raise
+                entry = (now + NEGATIVE_TTL, e)
+            with self._lock:
+                self._cache[key] = entry
+        if isinstance(entry[1], socket.gaierror):
+            raise socket.gaierror(*entry[1].args)
+        return list(entry[1])
+
+    def hit_rate(self):
+        """Return the percentage of lookups that were answered from the
+        cache."""
+        if not self.hits + self.misses:
+            return 0
+        return 100.0 * self.hits / (self.hits + self.misses)
+
+    def install(self):
+        """Start using the cache for all host name lookups."""
+        socket.getaddrinfo = self.getaddrinfo
+
+    def uninstall(self):
+        """Go back to the original host name lookups."""
+        if socket.getaddrinfo == self.getaddrinfo:
+            socket.getaddrinfo = self._getaddrinfo
@@ -0,0 +1,555 @@
+# eventloop.py - fetch many links at the same time from a single thread
+#
+# Copyright (C) 2026 agent
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# The files produced as output from the software do not automatically fall
+# under the copyright of the software, unless explicitly stated otherwise.
+
+"""Alternative to the thread pool that uses non-blocking sockets and an
+asyncore event loop to have many HTTP requests in flight from a single
+thread. The requests and responses are passed through the handlers of the
+urllib2 opener so cookies and redirects are handled the same way as with
+normal urllib2 requests. Links with other schemes are fetched with urllib2
+as usual.
+
+Host names are looked up by a few resolver threads because there is no
+non-blocking variant of getaddrinfo(). The resolver threads wake up the event
+loop through a pipe when a lookup is done."""
+
+import asyncore
+import collections
+import cStringIO
+import datetime
+import errno
+import fcntl
+import httplib
+import logging
+import os
+import Queue
+import socket
+import ssl
+import sys
+import threading
+import time
+import urllib
+import urllib2
+
+from webcheck import config
+import webcheck.parsers.html
+
+
+logger = logging.getLogger(__name__)
+
+
+# errors that indicate that a non-blocking operation should be retried
+_retry_errors = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
+# the number of threads that look up host names
+RESOLVER_THREADS = 4
+
+
+def _dechunk(data):
+    """Decode a body that was sent with chunked transfer encoding."""
+    body = []
+    while '\n' in data:
+        line, data = data.split('\n', 1)
+        size = int(line.split(';', 1)[0].strip(), 16)
+        if size == 0:
+            break
+        body.append(data[:size])
+        # skip the chunk and the CRLF following it
+        data = data[size:].lstrip('\r\n')
+    return ''.join(body)
+
+
+class _Lookup(object):
+    """The lookup of the address to connect to for a request. The address
+    (or the error) is filled in by the resolver."""
+
+    def __init__(self, item, request):
+        self.item = item
+        self.request = request
+        self.use_ssl = (request.get_type() == 'https')
+        host, port = urllib.splitport(request.get_host())
+        self.host = host
+        self.port = int(port or (443 if self.use_ssl else 80))
+        self.addrinfo = None
+        self.error = None
+
+    def run(self):
+        """Look up the address (this blocks)."""
+        try:
+            self.addrinfo = socket.getaddrinfo(
+                self.host, self.port, 0, socket.SOCK_STREAM)[0]
+        except Exception, e:
+            self.error = e
+
+
+class _Waker(asyncore.file_dispatcher):
+    """Pipe that is used to wake up the event loop from other threads."""
+
+    # the waker is never aborted by the event loop
+    deadline = None
+
+    def __init__(self, socket_map):
+        read, self._write = os.pipe()
+        asyncore.file_dispatcher.__init__(self, read, map=socket_map)
+        # the dispatcher uses a copy of the file descriptor
+        os.close(read)
+        # the loop is woken up anyway when the pipe is full
+        flags = fcntl.fcntl(self._write, fcntl.F_GETFL, 0)
+        fcntl.fcntl(self._write, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+    def wake(self):
+        """Make the event loop return from waiting."""
+        try:
+            os.write(self._write, 'x')
+        except OSError, e:
+            if e.errno not in _retry_errors:
+                raise
+
+    def writable(self):
+        return False
+
+    def handle_read(self):
+        try:
+            self.socket.recv(4096)
+        except OSError, e:
+            if e.errno not in _retry_errors:
+                raise
+
+    def close(self):
+        asyncore.file_dispatcher.close(self)
+        os.close(self._write)
+
+
+class _Resolver(object):
+    """Threads that look up the addresses for the event loop.
+
+    The available properties of this class are:
+
+      pending   - the number of submitted lookups that have not been
+                  returned by get_results() yet
+    """
+
+    def __init__(self, socket_map, threads):
+        self.pending = 0
+        self._tasks = Queue.Queue()
+        self._results = collections.deque()
+        self._waker = _Waker(socket_map)
+        self._threads = []
+        for i in range(threads):
+            thread = threading.Thread(target=self._run,
+                                      name='resolver-%d' % i)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self):
+        """Handle lookups from the task queue until None is received."""
+        while True:
+            lookup = self._tasks.get()
+            if lookup is None:
+                break
+            lookup.run()
+            self._results.append(lookup)
+            self._waker.wake()
+
+    def submit(self, lookup):
+        """Schedule the lookup."""
+        self.pending += 1
+        self._tasks.put(lookup)
+
+    def get_results(self):
+        """Return the lookups that are done without waiting."""
+        results = []
+        while self._results:
+            results.append(self._results.popleft())
+        self.pending -= len(results)
+        return results
+
+    def close(self):
+        """Stop the resolver threads."""
+        for thread in self._threads:
+            self._tasks.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._waker.close()
+
+
+class _Channel(asyncore.dispatcher):
+    """A single HTTP request and response over a non-blocking socket. The
+    request is sent with a Connection: close header so the response is
+    complete when the server closes the connection."""
+
+    def __init__(self, loop, lookup):
+        asyncore.dispatcher.__init__(self, map=loop.socket_map)
+        self.loop = loop
+        self.item = lookup.item
+        self.request = request = lookup.request
+        self.data = []
+        self.received = 0
+        self.error = None
+        self.sent = False
+        self.done = False
+        self.handshaking = False
+        # whether the connection (including any TLS handshake) was set up
+        self.established = False
+        # whether the body of the response is needed (None until the
+        # headers of the response have been seen)
+        self.wants_body = None
+        self.started = time.time()
+        # the time at which the request is aborted
+        self.deadline = None
+        self._extend_deadline(
+            getattr(request, 'connect_timeout', None) or request.timeout)
+        self.outbuf = self._format_request(request)
+        self.hostname = lookup.host
+        self.use_ssl = lookup.use_ssl
+        family, socktype, proto, canonname, sockaddr = lookup.addrinfo
+        self.create_socket(family, socktype)
+        try:
+            self.connect(sockaddr)
+        except:
+            self.close()
+            raise
+
+    def _extend_deadline(self, timeout):
+        """Allow the request to wait for the timeout (in seconds)."""
+        if timeout is not None:
+            self.deadline = time.time() + timeout
+
+    def _format_request(self, request):
+        """Return the request line and the headers to send."""
+        headers = dict(request.unredirected_hdrs)
+        headers.update(request.headers)
+        headers['Connection'] = 'close'
+        lines = ['%s %s HTTP/1.1' % (request.get_method(),
+                                     request.get_selector())]
+        lines.extend('%s: %s' % (name.title(), value)
+                     for name, value in headers.items())
+        return '\r\n'.join(lines) + '\r\n\r\n'
+
+    def _handshake(self):
+        """Continue with the TLS handshake."""
+        try:
+            self.socket.do_handshake()
+            self.handshaking = False
+            self.established = True
+        except ssl.SSLError, e:
+            if e.args[0] not in (ssl.SSL_ERROR_WANT_READ,
+                                 ssl.SSL_ERROR_WANT_WRITE):
+                raise
+
+    def handle_connect(self):
+        self.loop.crawler._connections.count(False)
+        self._extend_deadline(self.request.timeout)
+        if self.use_ssl:
+            if hasattr(ssl, 'create_default_context'):
+                context = ssl.create_default_context()
+                self.socket = context.wrap_socket(
+                    self.socket, server_hostname=self.hostname,
+                    do_handshake_on_connect=False)
+            else:
+                self.socket = ssl.wrap_socket(
+                    self.socket, do_handshake_on_connect=False)
+            self.handshaking = True
+        else:
+            self.established = True
+
+    def readable(self):
+        return not self.done
+
+    def writable(self):
+        return not self.done and (
+            not self.connected or self.handshaking or bool(self.outbuf))
+
+    def handle_write(self):
+        if self.handshaking:
+            self._handshake()
+            return
+        try:
+            sent = self.socket.send(self.outbuf)
+        except ssl.SSLError, e:
+            if e.args[0] == ssl.SSL_ERROR_WANT_WRITE:
+                return
+            raise
+        except socket.error, e:
+            if e.args[0] in _retry_errors:
+                return
+            raise
+        self.outbuf = self.outbuf[sent:]
+        self.sent = not self.outbuf
+        self._extend_deadline(self.request.timeout)
+
+    def _read(self):
+        """Read the available data from the socket. Returns False when the
+        connection was closed by the other end."""
+        while True:
+            try:
+                data = self.socket.recv(65536)
+            except ssl.SSLError, e:
+                if e.args[0] == ssl.SSL_ERROR_WANT_READ:
+                    return True
+                # many servers close the connection without a TLS shutdown
+                if self.data:
+                    return False
+                raise
+            except socket.error, e:
+                if e.args[0] in _retry_errors:
+                    return True
+                raise
+            if not data:
+                return False
+            if not self.data:
+                self.item.latency = time.time() - self.started
+            self.data.append(data)
+            self.received += len(data)
+            self._extend_deadline(self.request.timeout)
+            # stop reading after the headers if the content is not needed
+            if self.wants_body is None:
+                self.wants_body = self._check_headers()
+            if self.wants_body is False:
+                return False
+            # stop reading when the maximum transfer size is exceeded
+            # (the headers should fit in the additional buffer)
+            if config.MAX_TRANSFER_SIZE and \
+               self.received > (config.MAX_TRANSFER_SIZE + 64) * 1024:
+                return False
+
+    def _check_headers(self):
+        """Check whether the body of the response should be read once all
+        headers have been received. For external links only HTML is read to
+        look for anchors."""
+        header, sep, body = ''.join(self.data).partition('\r\n\r\n')
+        if not sep:
+            return None
+        if not self.item.wants_content:
+            return False
+        if self.item.is_internal:
+            return True
+        headers = httplib.HTTPMessage(
+            cStringIO.StringIO(header.partition('\n')[2] + '\r\n\r\n'), 0)
+        return headers.gettype() in webcheck.parsers.html.mimetypes
+
+    def handle_read(self):
+        if self.handshaking:
+            self._handshake()
+        elif not self._read():
+            self.finish()
+
+    def handle_close(self):
+        # read any remaining data before considering the response complete
+        try:
+            if self.connected and not self.handshaking:
+                self._read()
+        except (socket.error, ssl.SSLError):
+            pass
+        if not self.data and self.error is None:
+            self.error = httplib.BadStatusLine('')
+        self.finish()
+
+    def handle_error(self):
+        self.error = sys.exc_info()[1]
+        self.finish()
+
+    def handle_timeout(self):
+        """Abort the request because the deadline has passed."""
+        self.error = socket.timeout('timed out')
+        self.finish()
+
+    def finish(self):
+        """Close the connection and hand the result back to the loop."""
+        if not self.done:
+            self.done = True
+            self.close()
+            self.loop._finish(self)
+
+    def get_response(self):
+        """Return the response as a urllib2 response object. This raises
+        the same exceptions that urllib2 raises for the problem."""
+        if self.error is not None:
+            # problems before the request has been sent are reported
+            # as an URLError like urllib2 does (except for timeouts after
+            # the connection has been set up)
+            if not self.sent and \
+               not isinstance(self.error, urllib2.URLError) and \
+               not (isinstance(self.error, socket.timeout) and
+                    self.established):
+                raise urllib2.URLError(self.error)
+            raise self.error
+        data = ''.join(self.data)
+        # split the status line and headers from the body
+        header, sep, body = data.partition('\r\n\r\n')
+        if not sep:
+            header, sep, body = data.partition('\n\n')
+        statusline, sep, header = header.partition('\n')
+        try:
+            version, status, reason = (statusline.strip().split(None, 2) +
+                                       [''])[:3]
+            status = int(status)
+        except ValueError:
+            raise httplib.BadStatusLine(statusline)
+        if not version.startswith('HTTP/'):
+            raise httplib.BadStatusLine(statusline)
+        headers = httplib.HTTPMessage(cStringIO.StringIO(header + '\r\n\r\n'), 0)
+        if 'chunked' in headers.getheader('Transfer-Encoding', '').lower():
+            body = _dechunk(body)
+        response = urllib2.addinfourl(
+            cStringIO.StringIO(body), headers,
+            self.request.get_full_url(), status)
+        response.msg = reason.strip()
+        return response
+
+
+class EventLoop(object):
+    """Fetch and parse links from a single thread using an asyncore event
+    loop. This object provides the same interface as the ThreadPool class.
+
+    The available properties of this class are:
+
+      pending   - the number of submitted items that have not been returned
+                  by get_results() yet
+      capacity  - the number of requests that may be in flight at once
+    """
+
+    def __init__(self, crawler, opener, connections):
+        self.crawler = crawler
+        self.opener = opener
+        self.capacity = connections
+        self.pending = 0
+        self.socket_map = {}
+        self._resolver = _Resolver(self.socket_map, RESOLVER_THREADS)
+        self._results = []
+        self._restart = []
+
+    def submit(self, item):
+        """Start fetching the item."""
+        self.pending += 1
+        scheme = item.url.split(':', 1)[0].lower()
+        if scheme not in ('http', 'https'):
+            # fall back to a blocking urllib2 request
+            self.crawler._fetch_and_parse(item)
+            self._results.append(item)
+            return
+        logger.info(item.url)
+        item.fetched = datetime.datetime.now()
+        self._start(item)
+
+    def _start(self, item):
+        """Set up the request for the item and look up the host."""
+        try:
+            # let the urllib2 handlers add headers (e.g. cookies)
+            request = self.crawler._get_request(item)
+            request.timeout = item.timeout
+            protocol = request.get_type()
+            for processor in self.opener.process_request.get(protocol, []):
+                request = getattr(processor, protocol + '_request')(request)
+            self._resolver.submit(_Lookup(item, request))
+        except urllib2.URLError, e:
+            self.crawler._handle_error(item, e)
+            self._results.append(item)
+        except ValueError, e:
+            self.crawler._handle_error(item, urllib2.URLError(e))
+            self._results.append(item)
+
+    def _connect(self, lookup):
+        """Open the connection for the request once the host is known."""
+        if lookup.error is not None:
+            self.crawler._handle_error(
+                lookup.item, urllib2.URLError(lookup.error))
+            self._results.append(lookup.item)
+            return
+        try:
+            _Channel(self, lookup)
+        except socket.error, e:
+            self.crawler._handle_error(lookup.item, urllib2.URLError(e))
+            self._results.append(lookup.item)
+
+    def _finish(self, channel):
+        """Process the response of the completed request."""
+        item = channel.item
+        request = channel.request
+        try:
+            response = channel.get_response()
+            # let the urllib2 handlers process the response
+            protocol = request.get_type()
+            for processor in self.opener.process_response.get(protocol, []):
+                response = getattr(processor, protocol + '_response')(
+                    request, response)
+            self.crawler._handle_response(item, response)
+            if item.method == 'HEAD' and item.wants_content:
+                # the content turned out to be needed after all
+                item.method = 'GET'
+                self._restart.append(item)
+                return
+        except urllib2.HTTPError, e:
+            if self.crawler._head_failed(item, e):
+                self._restart.append(item)
+                return
+            self.crawler._handle_error(item, e)
+        except urllib2.URLError, e:
+            self.crawler._handle_error(item, e)
+        except Exception, e:
+            logger.info('error reading HTTP response: %s', str(e))
+            self.crawler._handle_failure(item, e)
+        else:
+            if item.wants_content:
+                self.crawler._parse_response(item, response)
+        self._results.append(item)
+
+    def get_results(self, timeout=None):
+        """Run the event loop until at least one item has been handled or
+        the timeout (in seconds) expired and return the handled items."""
+        if timeout is not None:
+            end = time.time() + timeout
+        while True:
+            # start new requests for items that need another request (this
+            # is not done from _finish() to not confuse asyncore)
+            restart = self._restart
+            self._restart = []
+            for item in restart:
+                self._start(item)
+            for lookup in self._resolver.get_results():
+                self._connect(lookup)
+            # the waker of the resolver is always in the socket map
+            if self._results or not (self._resolver.pending or
+                                     len(self.socket_map) > 1):
+                break
+            wait = 0.5
+            if timeout is not None:
+                wait = max(0, min(wait, end - time.time()))
+            asyncore.loop(timeout=wait, use_poll=True, map=self.socket_map,
+                          count=1)
+            # abort requests that take too long
+            now = time.time()
+            for channel in self.socket_map.values():
+                if channel.deadline is not None and channel.deadline < now:
+                    channel.handle_timeout()
+            if timeout is not None and time.time() > end:
+                break
+        results = self._results
+        self._results = []
+        self.pending -= len(results)
+        return results
+
+    def close(self):
+        """Abort any requests that are still in progress."""
+        self._resolver.close()
+        for channel in self.socket_map.values():
+            channel.close()
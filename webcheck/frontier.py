@@ -0,0 +1,162 @@
+# frontier.py - queue of links that still need to be crawled
+#
+# Copyright (C) 2026 agent
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# The files produced as output from the software do not automatically fall
+# under the copyright of the software, unless explicitly stated otherwise.
+
+"""In-memory queue of links that still need to be crawled. Links are
+ordered by depth and priority (lower first) and the order in which they
+were added. Every host has it's own queue so links to hosts that cannot
+be sent a request right now can be skipped without looking at all the
+links of that host. Links can also be added with a delay (e.g. to retry
+them later), they are only returned once the delay has passed."""
+
+import heapq
+import itertools
+import time
+import urlparse
+
+
+def _get_host(url):
+    """Return the key that is used to group the links per host."""
+    return urlparse.urlsplit(url)[1].lower()
+
+
+class Frontier(object):
+    """Priority queue of links (stored as id and URL) per host."""
+
+    def __init__(self):
+        # host -> heap of (key, link_id, url)
+        self._queues = {}
+        # heap of (key, host) of the first link of every host queue
+        self._heads = []
+        # host -> key of the current first link of the host queue
+        self._headkeys = {}
+        # link_id -> key the link was last queued with
+        self._keys = {}
+        # heap of (time, key, link_id, url) of links that are added later
+        self._delayed = []
+        # (depth, priority) -> number of queued links
+        self._counts = {}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _count(self, key, value):
+        """Update the number of queued links with the depth and priority of
+        the key."""
+        count = self._counts.get(key[:2], 0) + value
+        if count:
+            self._counts[key[:2]] = count
+        else:
+            del self._counts[key[:2]]
+
+    def min_depth(self, priority):
+        """Return the lowest depth of the queued links with the specified
+        priority (None if there are no such links)."""
+        depths = [depth for depth, prio in self._counts if prio == priority]
+        if depths:
+            return min(depths)
+
+    def _update_head(self, host):
+        """Ensure that the first link of the host queue is in the heap of
+        heads (and forget about the host if the queue is empty)."""
+        queue = self._queues[host]
+        # drop entries of links that were queued again with a lower key
+        while queue and self._keys.get(queue[0][1]) != queue[0][0]:
+            heapq.heappop(queue)
+        if not queue:
+            del self._queues[host]
+            self._headkeys.pop(host, None)
+        elif self._headkeys.get(host) != queue[0][0]:
+            self._headkeys[host] = queue[0][0]
+            heapq.heappush(self._heads, (queue[0][0], host))
+
+    def _add(self, key, link_id, url):
+        """Add the link to the queue of the host."""
+        host = _get_host(url)
+        heapq.heappush(self._queues.setdefault(host, []), (key, link_id, url))
+        self._update_head(host)
+
+    def _release(self, now):
+        """Move the delayed links whose time has come to the host queues."""
+        while self._delayed and self._delayed[0][0] <= now:
+            when, key, link_id, url = heapq.heappop(self._delayed)
+            # skip links that were queued again without a delay
+            if self._keys.get(link_id) == key:
+                self._add(key, link_id, url)
+
+    def push(self, link_id, url, depth, priority=0, delay=None):
+        """Add the link to the queue. A link that is already queued is only
+        moved if the new depth and priority come before the old ones. If a
+        delay (in seconds) is given, the link will not be returned before
+        the delay has passed."""
+        current = self._keys.get(link_id)
+        if current is not None and current[:2] <= (depth, priority):
+            return
+        if current is not None:
+            self._count(current, -1)
+        key = (depth, priority, next(self._counter))
+        self._keys[link_id] = key
+        self._count(key, 1)
+        if delay:
+            heapq.heappush(self._delayed,
+                           (time.time() + delay, key, link_id, url))
+        else:
+            self._add(key, link_id, url)
+
+    def pop(self, scheduler, max_depth=None):
+        """Remove and return the id of the first link whose host can be sent
+        a request now according to the scheduler. Links that are deeper than
+        max_depth are not returned. If there is no such link, None is
+        returned together with the number of seconds until one of the hosts
+        can be sent a request or a delayed link becomes available (None if
+        no host can be sent a request until a request finishes or if the
+        queue is empty)."""
+        self._release(time.time())
+        skipped = []
+        delay = None
+        if self._delayed:
+            delay = max(0, self._delayed[0][0] - time.time())
+        try:
+            while self._heads:
+                key, host = heapq.heappop(self._heads)
+                # skip heads that are no longer current
+                if self._headkeys.get(host) != key:
+                    continue
+                # the remaining links are all too deep
+                if max_depth is not None and key[0] > max_depth:
+                    skipped.append((key, host))
+                    break
+                queue = self._queues[host]
+                wait = scheduler.get_delay(queue[0][2])
+                if wait == 0:
+                    key, link_id, url = heapq.heappop(queue)
+                    del self._keys[link_id]
+                    self._count(key, -1)
+                    del self._headkeys[host]
+                    self._update_head(host)
+                    return link_id, None
+                skipped.append((key, host))
+                if wait is not None and (delay is None or wait < delay):
+                    delay = wait
+            return None, delay
+        finally:
+            for head in skipped:
+                heapq.heappush(self._heads, head)
@@ -0,0 +1,255 @@
+# ftp.py - urllib2 handler that reuses FTP connections
+#
+# Copyright (C) 2026 agent
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# The files produced as output from the software do not automatically fall
+# under the copyright of the software, unless explicitly stated otherwise.
+
+"""urllib2 handler for ftp URLs that keeps the logged in control connection
+open so it can be used for checking other files on the same server.
+
+Information about files is found with the SIZE and MDTM commands so the
+file does not need to be transferred for HEAD requests. If the server does
+not allow SIZE the file is looked up with LIST instead. The content of a
+file is only transferred for GET requests."""
+
+import calendar
+import cStringIO
+import email.utils
+import errno
+import ftplib
+import logging
+import mimetools
+import mimetypes
+import socket
+import sys
+import time
+import urllib
+import urllib2
+
+
+logger = logging.getLogger(__name__)
+
+
+# errors after which the connection cannot be used any more
+_closed_errors = (socket.error, EOFError, ftplib.error_temp)
+
+# the socket errors that indicate that the connection was closed
+_closed_socket_errors = (errno.ECONNRESET, errno.EPIPE)
+
+
+def _is_closed(e):
+    """Check whether the error (one of _closed_errors) means that the
+    server closed the idle connection and not, for instance, that a
+    timeout occurred."""
+    if isinstance(e, socket.error):
+        return not isinstance(e, socket.timeout) and \
+            bool(e.args) and e.args[0] in _closed_socket_errors
+    return True
+
+
+def _parse_mdtm(response):
+    """Return the modification time (in seconds since the epoch) from the
+    response to an MDTM command."""
+    try:
+        value = response.split(None, 1)[1].strip()
+        return calendar.timegm(time.strptime(value[:14], '%Y%m%d%H%M%S'))
+    except (IndexError, ValueError):
+        return None
+
+
+def _parse_list_size(lines):
+    """Try to find the size of the file from the output of the LIST
+    command (this only works for UNIX-style listings)."""
+    if len(lines) == 1:
+        fields = lines[0].split()
+        if len(fields) >= 9 and fields[4].isdigit():
+            return int(fields[4])
+
+
+def _list(ftp, path):
+    """Return the lines of the output of the LIST command."""
+    lines = []
+    ftp.retrlines('LIST ' + path, lines.append)
+    # retrlines() switches to ASCII mode but SIZE and RETR need binary mode
+    ftp.voidcmd('TYPE I')
+    return lines
+
+
+class _Transfer(object):
+    """File-like object for reading the data connection of a RETR command.
+    Closing it puts the control connection back in the pool."""
+
+    def __init__(self, pool, key, ftp, conn):
+        self.pool = pool
+        self.key = key
+        self.ftp = ftp
+        self.conn = conn
+        self.fp = conn.makefile('rb')
+        self.read = self.fp.read
+        self.readline = self.fp.readline
+        self.readlines = self.fp.readlines
+
+    def close(self):
+        if self.ftp is None:
+            return
+        self.fp.close()
+        self.conn.close()
+        # the server reports the status of the transfer (which is an error
+        # if the transfer was aborted)
+        try:
+            self.ftp.voidresp()
+            self.pool.put(self.key, self.ftp)
+        except (ftplib.Error, socket.error, EOFError):
+            self.ftp.close()
+        self.ftp = None
+
+
+class FTPHandler(urllib2.FTPHandler):
+    """Handler for ftp URLs that reuses logged in connections from the
+    pool."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def _connect(self, req, host, port, user, passwd):
+        """Set up a new logged in connection."""
+        timeout = getattr(req, 'connect_timeout', None) or req.timeout
+        ftp = ftplib.FTP()
+        try:
+            ftp.connect(host, port, timeout)
+            self.pool.count(False)
+            if ftp.sock is not None:
+                ftp.sock.settimeout(req.timeout)
+            ftp.login(user, passwd)
+            ftp.voidcmd('TYPE I')
+            # paths in URLs are relative to the login directory
+            try:
+                ftp.webcheck_home = ftp.pwd().rstrip('/')
+            except ftplib.error_perm:
+                ftp.webcheck_home = ''
+        except:
+            ftp.close()
+            raise
+        return ftp
+
+    def _stat(self, ftp, path):
+        """Return the size, modification time and whether the path is a
+        directory."""
+        size = mtime = None
+        if path.endswith('/'):
+            ftp.cwd(path)
+            return None, None, True
+        try:
+            size = ftp.size(path)
+        except ftplib.error_perm:
+            # the file is a directory or SIZE is not allowed
+            try:
+                ftp.cwd(path)
+                return None, None, True
+            except ftplib.error_perm:
+                pass
+            lines = _list(ftp, path)
+            if not lines:
+                raise ftplib.error_perm('550 %s: No such file or directory'
+                                        % path)
+            size = _parse_list_size(lines)
+        try:
+            mtime = _parse_mdtm(ftp.sendcmd('MDTM ' + path))
+        except ftplib.error_perm:
+            pass
+        return size, mtime, False
+
+    def _open(self, req, ftp, key, path):
+        """Get the information about the path and return the response."""
+        size, mtime, is_dir = self._stat(ftp, path)
+        headers = ''
+        if not is_dir:
+            mimetype = mimetypes.guess_type(req.get_full_url())[0]
+            if mimetype:
+                headers += 'Content-type: %s\n' % mimetype
+        if size is not None:
+            headers += 'Content-length: %d\n' % size
+        if mtime is not None:
+            headers += 'Last-modified: %s\n' % email.utils.formatdate(
+                mtime, usegmt=True)
+        headers = mimetools.Message(cStringIO.StringIO(headers))
+        if req.get_method() == 'HEAD':
+            self.pool.put(key, ftp)
+            fp = cStringIO.StringIO('')
+        elif is_dir:
+            lines = _list(ftp, path)
+            self.pool.put(key, ftp)
+            fp = cStringIO.StringIO('\n'.join(lines) + '\n')
+        else:
+            conn = ftp.ntransfercmd('RETR ' + path)[0]
+            fp = _Transfer(self.pool, key, ftp, conn)
+        return urllib2.addinfourl(fp, headers, req.get_full_url())
+
+    def ftp_open(self, req):
+        host = req.get_host()
+        if not host:
+            raise urllib2.URLError('ftp error: no host given')
+        user, host = urllib.splituser(host)
+        host, port = urllib.splitport(host)
+        port = int(port or ftplib.FTP_PORT)
+        if user:
+            user, passwd = urllib.splitpasswd(user)
+        else:
+            passwd = None
+        user = urllib.unquote(user or '')
+        passwd = urllib.unquote(passwd or '')
+        path = urllib.unquote(urllib.splitattr(req.get_selector())[0])
+        key = (host, port, user, passwd)
+        while True:
+            ftp = self.pool.get(key)
+            reused = ftp is not None
+            if reused:
+                if ftp.sock is not None:
+                    ftp.sock.settimeout(req.timeout)
+            else:
+                try:
+                    ftp = self._connect(req, host, port, user, passwd)
+                except socket.error, e:
+                    raise urllib2.URLError(e)
+                except ftplib.all_errors, e:
+                    raise urllib2.URLError('ftp error: %s' % e), \
+                        None, sys.exc_info()[2]
+            try:
+                response = self._open(
+                    req, ftp, key, ftp.webcheck_home + '/' + path.lstrip('/'))
+            except _closed_errors, e:
+                ftp.close()
+                if reused and _is_closed(e):
+                    # the server closed the idle connection
+                    continue
+                # the connection was made so this is not reported as a
+                # problem connecting to the host
+                if isinstance(e, socket.error):
+                    raise
+                raise urllib2.URLError('ftp error: %s' % e), \
+                    None, sys.exc_info()[2]
+            except ftplib.all_errors, e:
+                # the connection can be used for the next request
+                self.pool.put(key, ftp)
+                if reused:
+                    self.pool.count(True)
+                raise urllib2.URLError('ftp error: %s' % e), \
+                    None, sys.exc_info()[2]
+            if reused:
+                self.pool.count(True)
+            return response
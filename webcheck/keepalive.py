@@ -0,0 +1,236 @@
+# keepalive.py - urllib2 handlers that reuse HTTP connections
+#
+# Copyright (C) 2026 agent
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# The files produced as output from the software do not automatically fall
+# under the copyright of the software, unless explicitly stated otherwise.
+
+"""urllib2 handlers that keep HTTP and HTTPS connections open after a
+request so they can be reused for the next request to the same host.
+
+The standard urllib2 handlers send a Connection: close header and open a
+new connection (and do a new TLS handshake) for every request. These
+handlers keep a pool of idle connections per scheme and host. A connection
+is returned to the pool once the response body has been read completely
+(or is small enough to be discarded when the response is closed early)."""
+
+import errno
+import httplib
+import logging
+import socket
+import threading
+import urllib2
+
+
+logger = logging.getLogger(__name__)
+
+
+# the maximum number of idle connections that are kept per host
+MAX_IDLE = 10
+
+# remaining response bodies up to this size are read and discarded when
+# the response is closed early so the connection can be reused
+MAX_DISCARD = 64 * 1024
+
+# errors that indicate that the server closed an idle connection
+_closed_errors = (errno.ECONNRESET, errno.EPIPE)
+
+
+def _is_closed(e):
+    """Check whether the exception that was raised when using a reused
+    connection means that the server had closed the idle connection (in
+    which case the request can safely be sent again)."""
+    if isinstance(e, httplib.BadStatusLine):
+        return True
+    return isinstance(e, socket.error) and \
+        not isinstance(e, socket.timeout) and \
+        bool(e.args) and e.args[0] in _closed_errors
+
+
+class ConnectionPool(object):
+    """Pool of idle HTTP connections, keyed by scheme and host.
+
+    The available properties of this class are:
+
+      opened  - the number of connections that were set up
+      reused  - the number of requests that reused an idle connection
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = {}
+        self.opened = 0
+        self.reused = 0
+
+    def count(self, reused):
+        """Update the statistics for a connection that was used."""
+        with self._lock:
+            if reused:
+                self.reused += 1
+            else:
+                self.opened += 1
+
+    def get(self, key):
+        """Return an idle connection for the key or None."""
+        with self._lock:
+            connections = self._idle.get(key)
+            if connections:
+                return connections.pop()
+
+    def put(self, key, connection):
+        """Store the connection as idle for later use."""
+        with self._lock:
+            connections = self._idle.setdefault(key, [])
+            if len(connections) < MAX_IDLE:
+                connections.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        """Close all the idle connections."""
+        with self._lock:
+            for connections in self._idle.values():
+                for connection in connections:
+                    connection.close()
+            self._idle = {}
+
+
+class _PooledResponse(object):
+    """Wrapper around a httplib.HTTPResponse that puts the connection back
+    in the pool once the response has been completely read. It provides
+    the recv() and close() methods that socket._fileobject needs."""
+
+    def __init__(self, pool, key, connection, response):
+        self.pool = pool
+        self.key = key
+        self.connection = connection
+        self.response = response
+
+    def _release(self):
+        """Give the connection back to the pool if possible."""
+        if self.connection is not None:
+            if self.response.will_close:
+                self.connection.close()
+            else:
+                self.pool.put(self.key, self.connection)
+            self.connection = None
+
+    def recv(self, amt=None):
+        data = self.response.read(amt)
+        if self.response.isclosed():
+            self._release()
+        return data
+
+    def close(self):
+        if self.connection is None:
+            return
+        # read small remaining bodies to be able to reuse the connection
+        length = self.response.length
+        if not self.response.isclosed() and not self.response.will_close \
+           and length is not None and length <= MAX_DISCARD:
+            try:
+                self.response.read()
+            except (socket.error, httplib.HTTPException):
+                pass
+        if self.response.isclosed():
+            self._release()
+        else:
+            self.response.close()
+            self.connection.close()
+            self.connection = None
+
+
+class _KeepAliveMixin(object):
+    """Replacement for urllib2.AbstractHTTPHandler.do_open() that takes the
+    connection from the pool."""
+
+    def do_open(self, http_class, req, **http_conn_args):
+        host = req.get_host()
+        if not host:
+            raise urllib2.URLError('no host given')
+        # do not bother with pooling tunneled connections
+        if req._tunnel_host:
+            return urllib2.AbstractHTTPHandler.do_open(
+                self, http_class, req, **http_conn_args)
+        key = (req.get_type(), host)
+        headers = dict(req.unredirected_hdrs)
+        headers.update(dict((k, v) for k, v in req.headers.items()
+                            if k not in headers))
+        headers = dict(
+            (name.title(), val) for name, val in headers.items())
+        while True:
+            connection = self.pool.get(key)
+            reused = connection is not None
+            if not reused:
+                # use a separate timeout for setting up the connection
+                timeout = getattr(req, 'connect_timeout', None) or req.timeout
+                connection = http_class(host, timeout=timeout,
+                                        **http_conn_args)
+                try:
+                    connection.connect()
+                except socket.error, e:
+                    connection.close()
+                    raise urllib2.URLError(e)
+                self.pool.count(False)
+            try:
+                connection.request(req.get_method(), req.get_selector(),
+                                   req.data, headers)
+            except socket.error, e:
+                connection.close()
+                if reused and _is_closed(e):
+                    # the server closed the idle connection
+                    continue
+                raise urllib2.URLError(e)
+            # use the read timeout for the response
+            connection.timeout = req.timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(req.timeout)
+            try:
+                response = connection.getresponse(buffering=True)
+            except (socket.error, httplib.BadStatusLine), e:
+                connection.close()
+                if reused and _is_closed(e):
+                    continue
+                raise
+            break
+        if reused:
+            self.pool.count(True)
+        # wrap the response in the same way as urllib2 does
+        fp = socket._fileobject(
+            _PooledResponse(self.pool, key, connection, response), close=True)
+        resp = urllib2.addinfourl(fp, response.msg, req.get_full_url())
+        resp.code = response.status
+        resp.msg = response.reason
+        return resp
+
+
+class HTTPHandler(_KeepAliveMixin, urllib2.HTTPHandler):
+    """Handler for http URLs that reuses connections from the pool."""
+
+    def __init__(self, pool, debuglevel=0):
+        urllib2.HTTPHandler.__init__(self, debuglevel)
+        self.pool = pool
+
+
+if hasattr(urllib2, 'HTTPSHandler'):
+
+    class HTTPSHandler(_KeepAliveMixin, urllib2.HTTPSHandler):
+        """Handler for https URLs that reuses connections from the pool."""
+
+        def __init__(self, pool, debuglevel=0):
+            urllib2.HTTPSHandler.__init__(self, debuglevel)
+            self.pool = pool
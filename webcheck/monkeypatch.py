@@ -20,7 +20,6 @@
 # The files produced as output from the software do not automatically fall
 # under the copyright of the software, unless explicitly stated otherwise.
 
-import re
 import sys
 import urllib
 import urlparse
@@ -29,26 +28,6 @@ import urlparse
 __all__ = []
 
 
-# This monkeypatches RuleLine.applies_to to support * and $ characters in
-# robots.txt path names.
-def my_applies_to(ruleline, filename):
-    if not hasattr(ruleline, 'pattern'):
-        pat = []
-        # we need to unescape the * from the path here
-        for x in ruleline.path.replace('%2A', '*'):
-            if x == '*':
-                pat.append('.*')
-            elif x == '$':
-                pat.append(r'\Z')
-            else:
-                pat.append(re.escape(x))
-        ruleline.pattern = re.compile(''.join(pat) + '(?ms)')
-    return bool(ruleline.pattern.match(filename))
-
-from robotparser import RuleLine
-RuleLine.applies_to = my_applies_to
-
-
 # This monkeypatches RobotFileParser.can_fetch to include the query string
 # into the tested part of the URL, taken from http://bugs.python.org/issue6325
 # this should be fixed in Python 2.7
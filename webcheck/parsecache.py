@@ -0,0 +1,117 @@
+# parsecache.py - cache of parse results by content digest
+#
+# Copyright (C) 2026 agent
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# The files produced as output from the software do not automatically fall
+# under the copyright of the software, unless explicitly stated otherwise.
+
+"""Cache of the information that the parsers extracted from content so
+that content that was seen before (e.g. the same page under a different
+URL) does not need to be parsed again.
+
+Results are only reused for links in the same directory because the
+parsers resolve relative URLs against the URL of the page. Links from the
+page to itself are changed to point to the new page."""
+
+import collections
+import threading
+import urlparse
+
+
+# the number of parse results that are kept
+CACHE_SIZE = 1000
+
+
+def _get_key(digest, url):
+    """Return the cache key for content with the digest found at the
+    URL."""
+    return (digest, urlparse.urljoin(url, '.'))
+
+
+class _Result(object):
+    """The information that was extracted from the content."""
+
+    def __init__(self, link, pageproblems):
+        self.url = link.url
+        self.encoding = link.encoding
+        self.is_page = link.is_page
+        self.title = link.title
+        self.author = link.author
+        self.redirect = link.redirect
+        self.children = list(link.children)
+        self.embedded = list(link.embedded)
+        self.anchors = list(link.anchors)
+        self.pageproblems = list(link.pageproblems[pageproblems:])
+
+    def _relocate(self, url, link):
+        """Return the URL as found on the page of the link."""
+        base, fragment = urlparse.urldefrag(url)
+        if base == self.url:
+            return link.url + ('#' + fragment if fragment else '')
+        return url
+
+    def apply(self, link):
+        """Fill in the information in the link."""
+        link.set_encoding(self.encoding)
+        link.is_page = self.is_page
+        link.title = self.title
+        link.author = self.author
+        if self.redirect:
+            link.add_redirect(self._relocate(self.redirect, link))
+        for url in self.children:
+            link.add_child(self._relocate(url, link))
+        for url in self.embedded:
+            link.add_embed(self._relocate(url, link))
+        for anchor in self.anchors:
+            link.add_anchor(anchor)
+        for message in self.pageproblems:
+            link.add_pageproblem(message)
+
+
+class ParseCache(object):
+    """Cache of the most recent parse results by content digest."""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        # key -> _Result in the order they were used
+        self._results = collections.OrderedDict()
+
+    def get(self, digest, link):
+        """Fill in the information of content with the digest that was
+        parsed before in the link. Returns False if the content has not
+        been seen."""
+        key = _get_key(digest, link.url)
+        with self._lock:
+            result = self._results.pop(key, None)
+            if result is None:
+                return False
+            self._results[key] = result
+        result.apply(link)
+        return True
+
+    def put(self, digest, link, pageproblems=0):
+        """Store the information that was found by parsing content with
+        the digest in the link. Page problems that were added to the link
+        before parsing started can be skipped."""
+        key = _get_key(digest, link.url)
+        result = _Result(link, pageproblems)
+        with self._lock:
+            self._results.pop(key, None)
+            self._results[key] = result
+            while len(self._results) > self.size:
+                self._results.popitem(last=False)
@@ -26,7 +26,15 @@ A content-type module can be requested by the get_parsemodule() function.
 Each module should export the following function:
 
     parse(content, link)
-        Based on the content, fill in the common fields of the link object."""
+        Based on the content, fill in the common fields of the link object.
+
+Modules may also export the following function to be able to parse the
+content while it is being downloaded:
+
+    feeder(link)
+        Return an object with feed(content) and close() methods that
+        parses the parts of the content that are passed to feed() or None
+        if the content should be passed to parse() in one go."""
 
 # the modules that should be imported
 _modules = ('html', 'css')
@@ -39,10 +47,13 @@ def _init_modules():
     """Initialize the modules."""
     # go throught all known modules to probe the content-types
     # (do this only once)
+    parsermodules = {}
     for mod in _modules:
         parser = __import__('webcheck.parsers.' + mod, globals(), locals(), [mod])
         for mimetype in parser.mimetypes:
-            _parsermodules[mimetype] = parser
+            parsermodules[mimetype] = parser
+    # fill the map in one go because we may be called from multiple threads
+    _parsermodules.update(parsermodules)
 
 
 def get_parsermodule(mimetype):
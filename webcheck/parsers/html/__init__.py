@@ -71,29 +71,44 @@ def htmlunescape(txt):
     return txt
 
 
-def _parsefunction(content, link):
-    # we find a suitable parse function
-    global _parsefunction
-    try:
-        # try BeautifulSoup parser first
-        import webcheck.parsers.html.beautifulsoup
-        logger.debug('the BeautifulSoup parser is ok')
-        _parsefunction = webcheck.parsers.html.beautifulsoup.parse
-    except ImportError:
-        # fall back to legacy HTMLParser parser
-        logger.warn('falling back to the legacy HTML parser, '
-                    'consider installing BeautifulSoup')
-        import webcheck.parsers.html.htmlparser
-        _parsefunction = webcheck.parsers.html.htmlparser.parse
-    # call the actual parse function
-    _parsefunction(content, link)
+# the module that does the actual parsing
+_parsermodule = None
+
+
+def _get_parsermodule():
+    """Return the module that implements the HTML parsing."""
+    global _parsermodule
+    if _parsermodule is None:
+        try:
+            # try BeautifulSoup parser first
+            import webcheck.parsers.html.beautifulsoup
+            logger.debug('the BeautifulSoup parser is ok')
+            _parsermodule = webcheck.parsers.html.beautifulsoup
+        except ImportError:
+            # fall back to legacy HTMLParser parser
+            logger.warn('falling back to the legacy HTML parser, '
+                        'consider installing BeautifulSoup')
+            import webcheck.parsers.html.htmlparser
+            _parsermodule = webcheck.parsers.html.htmlparser
+    return _parsermodule
+
+
+def feeder(link):
+    """Return an object for parsing the content while it is being
+    downloaded or None if the content should be passed to parse()."""
+    # tidy needs the complete content
+    if config.TIDY_OPTIONS and link.is_internal:
+        return None
+    parsermodule = _get_parsermodule()
+    if hasattr(parsermodule, 'feeder'):
+        return parsermodule.feeder(link)
 
 
 def parse(content, link):
     """Parse the specified content and extract an url list, a list of images a
     title and an author. The content is assumed to contain HMTL."""
     # call the normal parse function
-    _parsefunction(content, link)
+    _get_parsermodule().parse(content, link)
     # call the tidy parse function
     if config.TIDY_OPTIONS:
         try:
@@ -0,0 +1,129 @@
+# anchors.py - scanner for finding anchors in HTML content
+#
+# Copyright (C) 2026 agent
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# The files produced as output from the software do not automatically fall
+# under the copyright of the software, unless explicitly stated otherwise.
+
+"""Lightweight scanner that looks for anchors (id attributes and names
+of <a> elements) in HTML content while it is being downloaded. This is
+used for external pages where only the requested anchors are of interest
+so building a complete parse tree is not needed and reading can stop as
+soon as all anchors have been found."""
+
+import logging
+import re
+
+from webcheck.myurllib import normalizeurl
+from webcheck.parsers.html import htmlunescape
+
+
+logger = logging.getLogger(__name__)
+
+
+# pattern for matching comments and start tags
+_tagpattern = re.compile(
+    r'''<!--.*?-->|<([a-zA-Z][^\s/>]*)((?:[^>"']|"[^"]*"|'[^']*')*)>''',
+    re.S)
+
+# pattern for matching the attributes of a start tag
+_attrpattern = re.compile(
+    r'''([^\s=/>"']+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]*)))?''')
+
+# the maximum number of bytes that are kept of an incomplete tag
+_MAX_TAG = 64 * 1024
+
+
+class _Scanner(object):
+    """Scanner that can be fed the content of the link in parts."""
+
+    def __init__(self, link, anchors):
+        self.link = link
+        # the requested anchors that have not been found yet
+        self.missing = set(anchors)
+        self.found = []
+        # the end of the previous part that may contain an incomplete tag
+        self.buffer = ''
+        # whether the previous part ended inside a comment
+        self.in_comment = False
+
+    def _add(self, value):
+        """Check whether the anchor is one of the requested ones."""
+        try:
+            value = value.decode(self.link.encoding or 'utf-8', 'replace')
+        except LookupError:
+            value = value.decode('ascii', 'replace')
+        anchor = normalizeurl(htmlunescape(value).strip()).lower()
+        if anchor in self.missing:
+            self.missing.remove(anchor)
+            self.found.append(anchor)
+
+    def _handle_tag(self, tag, attrs):
+        """Look for anchors in the attributes of the start tag."""
+        for m in _attrpattern.finditer(attrs):
+            name = m.group(1).lower()
+            if name == 'id' or (name == 'name' and tag == 'a'):
+                self._add(m.group(2) or m.group(3) or m.group(4) or '')
+
+    def feed(self, content):
+        """Scan the next part of the content."""
+        data = self.buffer + content
+        pos = 0
+        while True:
+            if self.in_comment:
+                # skip the comment, keeping only enough of the end of this
+                # part to find a --> that is split over parts
+                end = data.find('-->', pos)
+                if end < 0:
+                    self.buffer = data[max(pos, len(data) - 2):]
+                    return
+                pos = end + 3
+                self.in_comment = False
+            m = _tagpattern.search(data, pos)
+            # a comment before the next match is not closed in this part
+            comment = data.find('<!--', pos, m.start() if m else len(data))
+            if comment >= 0:
+                self.in_comment = True
+                pos = comment + 4
+                continue
+            if not m:
+                break
+            pos = m.end()
+            if m.group(1):
+                self._handle_tag(m.group(1).lower(), m.group(2))
+        # keep any incomplete tag for the next part
+        rest = data[pos:]
+        start = rest.find('<')
+        if start >= 0 and len(rest) - start > _MAX_TAG:
+            start = rest.rfind('<')
+        self.buffer = rest[start:] if start >= 0 else ''
+
+    def close(self):
+        """Store the anchors that were found in the link."""
+        logger.debug('anchors found: %d, missing: %d',
+                     len(self.found), len(self.missing))
+        # flag that the link contains a valid page
+        self.link.is_page = True
+        for anchor in self.found:
+            self.link.add_anchor(anchor)
+
+
+def scanner(link, anchors):
+    """Return an object that looks for the specified anchors in the content
+    of the link that is passed with feed(). The property missing contains
+    the anchors that have not been found yet."""
+    return _Scanner(link, anchors)
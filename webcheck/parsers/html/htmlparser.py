@@ -264,17 +264,53 @@ def _maketxt(txt, encoding):
     # fall back to locale's encoding
     return htmlunescape(txt.decode('ascii', 'replace'))
 
+
+class _Feeder(object):
+    """Parser that can be fed the content of the link in parts."""
+
+    def __init__(self, link):
+        self.link = link
+        self.parser = _MyHTMLParser(link)
+        self.failed = False
+
+    def feed(self, content):
+        """Parse the next part of the content."""
+        if self.failed:
+            return
+        try:
+            self.parser.feed(content.decode('ascii', 'ignore').encode())
+        except Exception, e:
+            # ignore (but log) all errors
+            logger.exception('caught exception: %s', str(e))
+            self.failed = True
+
+    def close(self):
+        """Finish parsing and store the results in the link."""
+        if not self.failed:
+            try:
+                self.parser.close()
+            except Exception, e:
+                # ignore (but log) all errors
+                logger.exception('caught exception: %s', str(e))
+        _process(self.parser, self.link)
+
+
+def feeder(link):
+    """Return an object that parses the content of the link while it is
+    being passed with feed()."""
+    return _Feeder(link)
+
+
 def parse(content, link):
     """Parse the specified content and extract an url list, a list of images a
     title and an author. The content is assumed to contain HMTL."""
-    # create parser and feed it the content
-    parser = _MyHTMLParser(link)
-    try:
-        parser.feed(content.decode('ascii', 'ignore').encode())
-        parser.close()
-    except Exception, e:
-        # ignore (but log) all errors
-        logger.exception('caught exception: %s', str(e))
+    parser = _Feeder(link)
+    parser.feed(content)
+    parser.close()
+
+
+def _process(parser, link):
+    """Store the information that was collected by the parser in the link."""
     # check for parser errors
     if parser.errmsg is not None:
         logger.debug('problem parsing html: %s', parser.errmsg)
@@ -22,20 +22,29 @@
 
 """Find references to undefined anchors.
 
+External pages are only scanned for the anchors that are requested so
+only those anchors are known for them. External links that are not HTML
+pages are not checked.
+
 This plugin does not output any files, it just finds problems."""
 
 __title__ = 'missing anchors'
 __author__ = 'Arthur de Jong'
 
-from webcheck.db import Session, Link, Anchor
+from webcheck.db import Session, Link, Anchor, PageProblem
 
 
 def postprocess(crawler):
     """Add all missing anchors as page problems to the referring page."""
     session = Session()
+    # remove problems that were added by a previous run
+    session.query(PageProblem).filter(
+        PageProblem.message.like(u'bad link: %: unknown anchor')).delete(
+        synchronize_session=False)
     # find all fetched links with requested anchors
     links = session.query(Link).filter(Link.reqanchors.any())
     links = links.filter(Link.fetched != None)
+    links = links.filter((Link.is_internal == True) | (Link.is_page == True))
     # go over list and find missing anchors
     # TODO: we can probably make a nicer query for this
     for link in links:
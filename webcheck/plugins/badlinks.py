@@ -30,13 +30,19 @@ __outputfile__ = 'badlinks.html'
 
 from sqlalchemy.orm import joinedload
 
-from webcheck.db import Session, Link
+from webcheck.db import Session, Link, PageProblem
 from webcheck.output import render
 
 
 def postprocess(crawler):
     """Add all bad links as pageproblems on pages where they are linked."""
     session = Session()
+    # remove problems that were added by a previous run (but not the ones
+    # that were just added by the anchors plugin)
+    session.query(PageProblem).filter(
+        PageProblem.message.like(u'bad link: %')).filter(
+        ~PageProblem.message.like(u'%: unknown anchor')).delete(
+        synchronize_session=False)
     # find all links with link problems
     links = session.query(Link).filter(Link.linkproblems.any()).options(joinedload(Link.linkproblems))
     # TODO: probably make it a nicer query over all linkproblems
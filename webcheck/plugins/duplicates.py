@@ -0,0 +1,51 @@
+# duplicates.py - plugin to list pages with the same content
+#
+# Copyright (C) 2026 agent
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# The files produced as output from the software do not automatically fall
+# under the copyright of the software, unless explicitly stated otherwise.
+
+"""List pages that have exactly the same content."""
+
+__title__ = 'duplicate pages'
+__author__ = 'agent'
+__outputfile__ = 'duplicates.html'
+
+import itertools
+
+from sqlalchemy.sql.functions import count
+
+from webcheck.db import Session, Link
+from webcheck.output import render
+
+
+def generate(crawler):
+    """Output the list of pages with the same content grouped
+    together."""
+    session = Session()
+    # find the digests of content that was found more than once
+    digests = session.query(Link.digest).filter_by(is_internal=True)
+    digests = digests.filter(Link.digest != None).group_by(Link.digest)
+    digests = digests.having(count(Link.id) > 1)
+    links = session.query(Link).filter_by(is_internal=True)
+    links = links.filter(Link.digest.in_(digests.subquery()))
+    links = links.order_by(Link.digest, Link.url)
+    groups = [list(group) for digest, group in
+              itertools.groupby(links, lambda link: link.digest)]
+    render(__outputfile__, crawler=crawler, title=__title__,
+           groups=groups)
+    session.close()
@@ -30,13 +30,16 @@ __outputfile__ = 'notitles.html'
 
 from sqlalchemy.sql.functions import char_length
 
-from webcheck.db import Session, Link
+from webcheck.db import Session, Link, PageProblem
 from webcheck.output import render
 
 
 def postprocess(crawler):
     """Add page problems for all pages without a title."""
     session = Session()
+    # remove problems that were added by a previous run
+    session.query(PageProblem).filter_by(message=u'missing title').delete(
+        synchronize_session=False)
     # get all internal pages without a title
     links = session.query(Link).filter_by(is_page=True, is_internal=True)
     links = links.filter((char_length(Link.title) == 0) |
@@ -35,7 +35,8 @@ from webcheck.output import render
 
 def get_size(link, seen=None):
     """Return the size of the link and all its embedded links, counting each
-    link only once."""
+    link only once. The number of bytes that need to be transferred (which
+    is smaller for compressed content) is stored as total_transfer_size."""
     # make a new list
     if seen is None:
         seen = set()
@@ -45,21 +46,26 @@ def get_size(link, seen=None):
     if not hasattr(link, 'total_size'):
         # add our size
         size = link.size or 0
+        transfer_size = link.transfer_size or size
         # add sizes of embedded objects
         for embed in link.embedded:
             if embed not in seen:
                 size += get_size(embed, seen)
+                transfer_size += embed.total_transfer_size
         link.total_size = size
+        link.total_transfer_size = transfer_size
     return link.total_size
 
 
 def generate(crawler):
     """Output the list of large pages."""
     session = Session()
-    links = session.query(Link).filter_by(is_page=True, is_internal=True)
+    links = list(session.query(Link).filter_by(is_page=True, is_internal=True))
+    for link in links:
+        get_size(link)
     links = [x for x in links
-             if get_size(x) >= config.REPORT_SLOW_URL_SIZE * 1024]
-    links.sort(lambda a, b: cmp(b.total_size, a.total_size))
+             if x.total_transfer_size >= config.REPORT_SLOW_URL_SIZE * 1024]
+    links.sort(lambda a, b: cmp(b.total_transfer_size, a.total_transfer_size))
     render(__outputfile__, crawler=crawler, title=__title__,
            links=links)
     session.close()
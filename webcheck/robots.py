@@ -0,0 +1,325 @@
+# robots.py - fetching, caching and matching of robots.txt files
+#
+# Copyright (C) 2026 agent
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# The files produced as output from the software do not automatically fall
+# under the copyright of the software, unless explicitly stated otherwise.
+
+"""Fetching, caching and matching of robots.txt files.
+
+The robots.txt files are fetched in the background as soon as a new site
+is found and are stored in the output directory so they can be reused in
+following runs until they expire (based on the HTTP caching headers). The
+rules that apply to webcheck are compiled into a single regular expression
+per site."""
+
+import email.utils
+import httplib
+import json
+import logging
+import os
+import re
+import robotparser
+import threading
+import time
+import urllib
+import urllib2
+import urlparse
+
+from webcheck import config
+
+
+logger = logging.getLogger(__name__)
+
+
+# the name that is matched against the User-agent lines
+USERAGENT = 'webcheck'
+
+# the time in seconds robots.txt files are kept if the server did not
+# specify an expiry time
+DEFAULT_EXPIRY = 24 * 60 * 60
+
+# the maximum size of robots.txt files that is read
+MAX_SIZE = 512 * 1024
+
+# the maximum number of redirects that are followed for robots.txt
+MAX_REDIRECTS = 5
+
+# the maximum number of groups in a Python regular expression
+_MAX_GROUPS = 99
+
+
+class _RobotFileParser(robotparser.RobotFileParser):
+    """Robots parser that also finds the Crawl-delay that applies to us."""
+
+    def __init__(self, url=''):
+        robotparser.RobotFileParser.__init__(self, url)
+        self.crawl_delay = None
+
+    def parse(self, lines):
+        robotparser.RobotFileParser.parse(self, lines)
+        applies = False
+        agents = False
+        for line in lines:
+            line = line.split('#', 1)[0]
+            if ':' not in line:
+                continue
+            key, value = [x.strip() for x in line.split(':', 1)]
+            key = key.lower()
+            if key == 'user-agent':
+                # a group may start with multiple user-agent lines
+                if not agents:
+                    applies = False
+                agent = value.split('/')[0].lower()
+                applies = applies or agent == '*' or \
+                    (agent and agent in USERAGENT)
+                agents = True
+            else:
+                agents = False
+                if key == 'crawl-delay' and applies:
+                    try:
+                        self.crawl_delay = float(value)
+                    except ValueError:
+                        pass
+
+
+def _path_pattern(path):
+    """Return a regular expression for the path of a robots.txt rule. This
+    supports * and $ characters in the path."""
+    # the path has been quoted by the robotparser module
+    path = path.replace('%2A', '*')
+    if path.endswith('%24'):
+        path = path[:-3] + '$'
+    pattern = []
+    for x in path:
+        if x == '*':
+            pattern.append('.*')
+        elif x == '$':
+            pattern.append(r'\Z')
+        else:
+            pattern.append(re.escape(x))
+    return ''.join(pattern)
+
+
+class Robots(object):
+    """The rules of a robots.txt file that apply to webcheck.
+
+    The available properties of this class are:
+
+      crawl_delay  - the Crawl-delay in seconds or None
+    """
+
+    def __init__(self, content='', status=200):
+        self.crawl_delay = None
+        self.disallow_all = status in (401, 403)
+        # list of (regexp, allowances) that match the rules in order
+        self._matchers = []
+        if status >= 400:
+            return
+        parser = _RobotFileParser()
+        parser.parse(content.splitlines())
+        self.crawl_delay = parser.crawl_delay
+        # find the entry that applies to us
+        for entry in parser.entries:
+            if entry.applies_to(USERAGENT):
+                break
+        else:
+            entry = parser.default_entry
+        if entry is None:
+            return
+        # combine the rules into as few regular expressions as possible
+        rules = entry.rulelines
+        for i in range(0, len(rules), _MAX_GROUPS):
+            chunk = rules[i:i + _MAX_GROUPS]
+            self._matchers.append((
+                re.compile('|'.join('(%s)' % _path_pattern(rule.path)
+                                    for rule in chunk), re.M | re.S),
+                [rule.allowance for rule in chunk]))
+
+    def can_fetch(self, url):
+        """Check whether the URL may be fetched."""
+        if self.disallow_all:
+            return False
+        # take the same part of the URL that robotparser uses
+        parsed = urlparse.urlparse(urllib.unquote(url))
+        path = urllib.quote(urlparse.urlunparse(
+            ('', '', parsed.path, parsed.params, parsed.query,
+             parsed.fragment))) or '/'
+        # the first matching rule counts
+        for regexp, allowances in self._matchers:
+            m = regexp.match(path)
+            if m:
+                return allowances[m.lastindex - 1]
+        return True
+
+
+def _get_expiry(info):
+    """Return the time until which the response may be used based on the
+    HTTP caching headers."""
+    now = time.time()
+    cache_control = [x.strip().lower() for x in
+                     info.getheader('Cache-Control', '').split(',')]
+    if 'no-store' in cache_control or 'no-cache' in cache_control:
+        return now
+    for directive in cache_control:
+        if directive.startswith('max-age='):
+            try:
+                return now + int(directive[8:])
+            except ValueError:
+                pass
+    expires = info.getheader('Expires')
+    if expires:
+        expires = email.utils.parsedate_tz(expires)
+        if expires:
+            return email.utils.mktime_tz(expires)
+    return now + DEFAULT_EXPIRY
+
+
+class RobotsCache(object):
+    """Cache of robots.txt files per site, stored in a directory.
+
+    The available properties of this class are:
+
+      fetched  - the number of robots.txt files that were downloaded
+      cached   - the number of robots.txt files that were read from the
+                 directory
+    """
+
+    def __init__(self, directory, opener):
+        self.directory = directory
+        self.opener = opener
+        self.fetched = 0
+        self.cached = 0
+        self._lock = threading.Lock()
+        # location -> Robots
+        self._robots = {}
+        # location -> threading.Event for fetches in progress
+        self._pending = {}
+
+    def _get_filename(self, location):
+        """Return the name of the file that stores robots.txt."""
+        return os.path.join(self.directory, urllib.quote(location, '') + '.json')
+
+    def _load(self, location):
+        """Return the stored robots.txt information if it is still valid."""
+        try:
+            with open(self._get_filename(location), 'r') as f:
+                data = json.load(f)
+            if data['expires'] > time.time():
+                return Robots(data['content'], data['status'])
+        except (IOError, ValueError, KeyError, TypeError):
+            pass
+
+    def _store(self, location, content, status, expires):
+        """Store the robots.txt information in the directory."""
+        try:
+            if not os.path.isdir(self.directory):
+                os.mkdir(self.directory)
+            filename = self._get_filename(location)
+            with open(filename + '.tmp', 'w') as f:
+                json.dump(dict(location=location, content=content,
+                               status=status, expires=expires), f)
+            os.rename(filename + '.tmp', filename)
+        except (IOError, OSError), e:
+            logger.warn('cannot store robots.txt: %s', str(e))
+
+    def _download(self, location):
+        """Download robots.txt for the site and return it's information."""
+        logger.info('getting robots.txt for %s', location)
+        url = location + '/robots.txt'
+        for i in range(MAX_REDIRECTS):
+            request = urllib2.Request(url)
+            # avoid getting compressed content
+            request.add_header('Accept-encoding', 'identity')
+            try:
+                response = self.opener.open(request, timeout=config.IOTIMEOUT)
+            except urllib2.HTTPError, e:
+                e.close()
+                if hasattr(e, 'newurl'):
+                    url = urlparse.urljoin(url, e.newurl)
+                    continue
+                if e.code >= 500:
+                    # consider this a temporary problem
+                    return Robots(status=e.code)
+                self._store(location, '', e.code, _get_expiry(e.info()))
+                return Robots(status=e.code)
+            try:
+                content = response.read(MAX_SIZE)
+            finally:
+                response.close()
+            self._store(location, content, 200, _get_expiry(response.info()))
+            return Robots(content)
+        return Robots()
+
+    def _get(self, location):
+        """Load or download robots.txt for the site."""
+        robots = self._load(location)
+        if robots is not None:
+            self.cached += 1
+            return robots
+        try:
+            robots = self._download(location)
+            self.fetched += 1
+            return robots
+        except (urllib2.URLError, IOError, httplib.HTTPException), e:
+            # ignore any problems getting robots.txt
+            logger.debug('cannot get robots.txt: %s', str(e))
+            return Robots()
+
+    def _fetch(self, location, event):
+        """Fetch robots.txt and signal that it is available."""
+        try:
+            robots = self._get(location)
+        except Exception, e:
+            logger.exception('unknown exception caught: %s', str(e))
+            robots = Robots()
+        with self._lock:
+            self._robots[location] = robots
+            del self._pending[location]
+        event.set()
+
+    def prefetch(self, location):
+        """Start getting robots.txt for the site (scheme://netloc) in the
+        background."""
+        with self._lock:
+            if location in self._robots or location in self._pending:
+                return
+            event = self._pending[location] = threading.Event()
+        thread = threading.Thread(target=self._fetch, args=(location, event),
+                                  name='robots-%s' % location)
+        thread.daemon = True
+        thread.start()
+
+    def get(self, location):
+        """Return the Robots object for the site (scheme://netloc), waiting
+        for it to be fetched if needed."""
+        with self._lock:
+            robots = self._robots.get(location)
+            event = self._pending.get(location)
+        if robots is not None:
+            return robots
+        if event is None:
+            self.prefetch(location)
+            with self._lock:
+                robots = self._robots.get(location)
+                event = self._pending.get(location)
+            if robots is not None:
+                return robots
+        # waiting without a timeout cannot be interrupted
+        while not event.wait(1):
+            pass
+        return self._robots[location]
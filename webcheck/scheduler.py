@@ -0,0 +1,204 @@
+# scheduler.py - limit the rate of requests per host
+#
+# Copyright (C) 2026 agent
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# The files produced as output from the software do not automatically fall
+# under the copyright of the software, unless explicitly stated otherwise.
+
+"""Keep track of the requests that are done to each host to be able to
+limit the request rate and the number of concurrent requests per host.
+
+Every host has a token bucket that is refilled at the configured rate. A
+request can be started when a token is available and when the host does
+not have the maximum number of requests in progress. Requests to other
+hosts are not affected by a host that is being limited.
+
+Hosts that cannot be connected to a number of times in a row are
+considered down. Links to such a host should not be fetched but get the
+last error instead, until a new request is tried (if a probe interval is
+configured) and succeeds.
+
+The time it takes for hosts to start sending a response is also tracked
+so that a read timeout can be used that is based on how fast the host
+normally responds instead of always waiting for the configured maximum."""
+
+import collections
+import logging
+import time
+import urlparse
+
+
+logger = logging.getLogger(__name__)
+
+
+# the number of response times per host that are kept
+LATENCY_SAMPLES = 100
+
+# the number of response times that are needed to base the timeout on
+MIN_SAMPLES = 5
+
+# the read timeout is this multiple of the 95th percentile response time
+TIMEOUT_FACTOR = 4
+
+# the shortest read timeout in seconds that is used
+MIN_TIMEOUT = 2.0
+
+
+class _Host(object):
+    """The request state of a single host."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.tokens = 1.0
+        self.updated = time.time()
+        self.active = 0
+        # the number of connection failures in a row and the last error
+        self.failures = 0
+        self.error = None
+        # the time after which a down host is tried again
+        self.probe_at = None
+        # the most recent response times
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+
+    def refill(self, now):
+        """Add the tokens that became available since the last update."""
+        if self.interval > 0:
+            self.tokens = min(
+                1.0, self.tokens + (now - self.updated) / self.interval)
+        else:
+            self.tokens = 1.0
+        self.updated = now
+
+
+class Scheduler(object):
+    """Decide when requests to a host can be done.
+
+    The available properties of this class are:
+
+      wait          - the minimum time in seconds between requests to
+                      the same host
+      max_per_host  - the maximum number of concurrent requests to the
+                      same host (None for no limit)
+      max_failures  - the number of connection failures in a row after
+                      which a host is considered down (0 or None to never
+                      consider a host down)
+      probe_interval - the time in seconds after which a host that is
+                      down is tried again (None to never try again)
+      timeout       - the maximum read timeout in seconds (None for no
+                      maximum)
+    """
+
+    def __init__(self, wait=0, max_per_host=None, max_failures=None,
+                 probe_interval=None, timeout=None):
+        self.wait = wait or 0
+        self.max_per_host = max_per_host
+        self.max_failures = max_failures
+        self.probe_interval = probe_interval
+        self.timeout = timeout
+        self._hosts = {}
+
+    def _get_host(self, url):
+        """Return the state of the host of the URL."""
+        key = urlparse.urlsplit(url)[1].lower()
+        host = self._hosts.get(key)
+        if host is None:
+            host = self._hosts[key] = _Host(self.wait)
+        return host
+
+    def set_crawl_delay(self, url, delay):
+        """Use the specified delay (e.g. from robots.txt) between requests
+        to the host of the URL if it is longer than the configured wait."""
+        host = self._get_host(url)
+        if delay > host.interval:
+            logger.debug('using crawl delay of %s seconds', delay)
+            host.interval = delay
+
+    def _is_down(self, host, now):
+        """Check whether the host is considered down."""
+        if not self.max_failures or host.failures < self.max_failures:
+            return False
+        return host.probe_at is None or now < host.probe_at
+
+    def get_error(self, url):
+        """Return the last connection error if the host of the URL is
+        considered down (None otherwise). If the host may be tried again
+        None is returned and a single request may be done to probe the
+        host."""
+        host = self._get_host(url)
+        now = time.time()
+        if self._is_down(host, now):
+            return host.error
+        if self.max_failures and host.failures >= self.max_failures:
+            # let other requests wait for the result of this probe
+            logger.debug('probing %s', url)
+            host.probe_at = now + self.probe_interval
+
+    def get_delay(self, url):
+        """Return the number of seconds until a request to the URL can be
+        started (0 if it can be started right away) or None if the host
+        first needs to finish a request."""
+        host = self._get_host(url)
+        # no request is done to hosts that are down
+        if self._is_down(host, time.time()):
+            return 0
+        if self.max_per_host and host.active >= self.max_per_host:
+            return None
+        host.refill(time.time())
+        if host.tokens >= 1.0:
+            return 0
+        return (1.0 - host.tokens) * host.interval
+
+    def get_timeout(self, url):
+        """Return the read timeout to use for a request to the URL. This is
+        a multiple of the 95th percentile of the recent response times of
+        the host, limited by the configured maximum (without a maximum no
+        timeout is used)."""
+        host = self._get_host(url)
+        if self.timeout is None or len(host.latencies) < MIN_SAMPLES:
+            return self.timeout
+        latencies = sorted(host.latencies)
+        p95 = latencies[int(0.95 * (len(latencies) - 1))]
+        return min(max(MIN_TIMEOUT, TIMEOUT_FACTOR * p95), self.timeout)
+
+    def start(self, url):
+        """Register that a request to the URL is started."""
+        host = self._get_host(url)
+        host.refill(time.time())
+        host.tokens -= 1.0
+        host.active += 1
+
+    def done(self, url, error=None, latency=None):
+        """Register that the request to the URL has finished. The error
+        should be passed if no connection could be made to the host and the
+        latency is the time in seconds it took to get the response."""
+        host = self._get_host(url)
+        host.active -= 1
+        if latency is not None:
+            host.latencies.append(latency)
+        if error is None:
+            host.failures = 0
+            host.error = None
+            host.probe_at = None
+            return
+        host.failures += 1
+        host.error = error
+        if host.failures == self.max_failures or host.probe_at is not None:
+            if host.probe_at is None:
+                logger.warn('%s seems to be down, not checking more links',
+                            urlparse.urlsplit(url)[1])
+            if self.probe_interval is not None:
+                host.probe_at = time.time() + self.probe_interval
@@ -0,0 +1,163 @@
+# urlindex.py - in-memory map of URLs to link ids
+#
+# Copyright (C) 2026 agent
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# The files produced as output from the software do not automatically fall
+# under the copyright of the software, unless explicitly stated otherwise.
+
+"""Process-local map of the URLs of all links in the database to their
+ids, so finding out whether a URL is known does not need a query.
+
+The compact variant only stores a 64-bit hash of every URL in a pair of
+arrays (open addressing with linear probing) which uses around 25 bytes
+per URL instead of the URL itself and the dictionary overhead. The chance
+that two different URLs get the same hash is negligible for even millions
+of URLs."""
+
+import array
+import hashlib
+import struct
+import sys
+
+
+class _DictTable(object):
+    """Storage of the map in a dictionary."""
+
+    def __init__(self):
+        self._ids = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def get(self, url):
+        return self._ids.get(url)
+
+    def put(self, url, link_id):
+        self._ids[url] = link_id
+
+    def memory(self):
+        return sys.getsizeof(self._ids) + sum(
+            sys.getsizeof(url) + sys.getsizeof(link_id)
+            for url, link_id in self._ids.iteritems())
+
+
+class _HashTable(object):
+    """Storage of the map in arrays of URL hashes and ids."""
+
+    def __init__(self, size=1024):
+        self._keys = array.array('l', [0]) * size
+        self._ids = array.array('l', [0]) * size
+        self._mask = size - 1
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def _hash(self, url):
+        """Return the non-zero hash of the URL."""
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        digest = hashlib.md5(url).digest()[:self._keys.itemsize]
+        return struct.unpack('l', digest)[0] or 1
+
+    def _find(self, key):
+        """Return the position of the key or the free slot for it."""
+        i = key & self._mask
+        while self._keys[i] != key and self._keys[i] != 0:
+            i = (i + 1) & self._mask
+        return i
+
+    def get(self, url):
+        i = self._find(self._hash(url))
+        if self._keys[i]:
+            return self._ids[i]
+
+    def put(self, url, link_id):
+        key = self._hash(url)
+        i = self._find(key)
+        if not self._keys[i]:
+            self._count += 1
+            self._keys[i] = key
+        self._ids[i] = link_id
+        # keep the table at most two thirds full
+        if self._count * 3 > len(self._keys) * 2:
+            self._grow()
+
+    def _grow(self):
+        """Double the size of the table."""
+        keys, ids = self._keys, self._ids
+        self._keys = array.array('l', [0]) * (len(keys) * 2)
+        self._ids = array.array('l', [0]) * (len(keys) * 2)
+        self._mask = len(self._keys) - 1
+        for key, link_id in zip(keys, ids):
+            if key:
+                i = self._find(key)
+                self._keys[i] = key
+                self._ids[i] = link_id
+
+    def memory(self):
+        return (len(self._keys) * self._keys.itemsize +
+                len(self._ids) * self._ids.itemsize)
+
+
+class URLIndex(object):
+    """Map of URLs to link ids.
+
+    The available properties of this class are:
+
+      hits    - the number of lookups of URLs that were known
+      misses  - the number of lookups of URLs that were not known
+    """
+
+    def __init__(self, compact=False):
+        self.clear(compact)
+
+    def __len__(self):
+        return len(self._table)
+
+    def clear(self, compact=None):
+        """Remove all URLs from the index, optionally switching between the
+        normal and compact storage."""
+        if compact is not None:
+            self.compact = compact
+        self._table = _HashTable() if self.compact else _DictTable()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, url):
+        """Return the id of the link with the URL (None if the URL is not
+        known)."""
+        link_id = self._table.get(url)
+        if link_id is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return link_id
+
+    def add(self, url, link_id):
+        """Record the id of the link with the URL."""
+        self._table.put(url, link_id)
+
+    def memory(self):
+        """Return the (approximate) number of bytes used by the index."""
+        return self._table.memory()
+
+    def hit_rate(self):
+        """Return the percentage of lookups that found the URL."""
+        if not self.hits + self.misses:
+            return 0
+        return 100.0 * self.hits / (self.hits + self.misses)
@@ -0,0 +1,193 @@
+# workers.py - pool of threads for fetching and parsing links
+#
+# Copyright (C) 2026 agent
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# The files produced as output from the software do not automatically fall
+# under the copyright of the software, unless explicitly stated otherwise.
+
+"""Pools of worker threads or processes that process crawl items. The
+workers only fetch and parse content, the results are handed back to the
+thread that submitted the items so that all database access is done from a
+single thread."""
+
+import logging
+import multiprocessing
+import Queue
+import signal
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+class ThreadPool(object):
+    """Pool of threads that call the handler for every submitted item.
+
+    The available properties of this class are:
+
+      pending   - the number of submitted items that have not been returned
+                  by get_results() yet
+      capacity  - the number of items that can be usefully pending
+    """
+
+    def __init__(self, handler, threads=1):
+        """Start the specified number of worker threads that call the
+        handler function for every submitted item. If less than two threads
+        are requested the items are handled in the calling thread."""
+        self.handler = handler
+        self.pending = 0
+        self._tasks = Queue.Queue()
+        self._results = Queue.Queue()
+        self._threads = []
+        if threads > 1:
+            # keep some items queued so the workers never wait for us
+            self.capacity = 2 * threads
+            for i in range(threads):
+                thread = threading.Thread(target=self._run,
+                                          name='worker-%d' % i)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+        else:
+            self.capacity = 1
+
+    def _run(self):
+        """Handle items from the task queue until None is received."""
+        while True:
+            item = self._tasks.get()
+            if item is None:
+                break
+            try:
+                self.handler(item)
+            except Exception, e:
+                # the handler should do it's own error handling
+                logger.exception('unknown exception caught: %s', str(e))
+            self._results.put(item)
+
+    def submit(self, item):
+        """Schedule the item for handling."""
+        self.pending += 1
+        if self._threads:
+            self._tasks.put(item)
+        else:
+            self.handler(item)
+            self._results.put(item)
+
+    def get_results(self, timeout=None):
+        """Return the list of items that have been handled, waiting at most
+        timeout seconds (or forever if timeout is None) for the first item to
+        become available."""
+        results = []
+        if not self.pending:
+            return results
+        try:
+            # note that Queue.get() without a timeout cannot be interrupted
+            results.append(self._results.get(
+                timeout=3600 if timeout is None else timeout))
+            while True:
+                results.append(self._results.get_nowait())
+        except Queue.Empty:
+            pass
+        self.pending -= len(results)
+        return results
+
+    def close(self):
+        """Stop all the worker threads."""
+        for thread in self._threads:
+            self._tasks.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+
+# the handler that is called for items in the worker processes
+_handler = None
+
+# the function that returns the counters of the worker process and the
+# values of the counters when the previous item was returned
+_counters = None
+_previous = {}
+
+
+def _init_process(handler, counters):
+    """Set up a worker process."""
+    global _handler, _counters
+    _handler = handler
+    _counters = counters
+    if counters:
+        # the values copied from the main process should not be counted
+        _previous.update(counters())
+    # leave handling of keyboard interrupts to the main process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _handle_item(item):
+    """Call the handler for the item in a worker process. This returns the
+    item and the changes to the counters."""
+    try:
+        _handler(item)
+    except Exception, e:
+        # the handler should do it's own error handling
+        logger.exception('unknown exception caught: %s', str(e))
+    changes = {}
+    if _counters:
+        for name, value in _counters().items():
+            changes[name] = value - _previous.get(name, 0)
+            _previous[name] = value
+    return item, changes
+
+
+class ProcessPool(ThreadPool):
+    """Pool of processes that call the handler for every submitted item.
+    This is useful when most of the time is spent parsing (e.g. for local
+    files) because threads cannot parse at the same time.
+
+    The items are copied to and from the worker processes so changes that
+    the handler makes to other objects are not seen by the caller. The
+    worker processes are forked so the handler does not need to be
+    picklable.
+
+    Statistics that are kept in the worker processes can be collected by
+    passing a function that returns a dict of counter values. The changes
+    in the worker processes are summed in the counters property."""
+
+    def __init__(self, handler, processes, counters=None):
+        self.handler = handler
+        self.pending = 0
+        self.capacity = 2 * processes
+        self.counters = {}
+        self._results = Queue.Queue()
+        self._threads = []
+        self._pool = multiprocessing.Pool(
+            processes, _init_process, (handler, counters))
+
+    def _done(self, result):
+        """Collect the handled item and the changes to the counters."""
+        item, changes = result
+        for name, value in changes.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+        self._results.put(item)
+
+    def submit(self, item):
+        """Schedule the item for handling."""
+        self.pending += 1
+        self._pool.apply_async(_handle_item, (item, ), callback=self._done)
+
+    def close(self):
+        """Stop all the worker processes."""
+        self._pool.close()
+        self._pool.join()